@@ -14,334 +14,93 @@
 
 # After converting the .ui to .py, use an import statement to import the gui into this script
 from NPCA_gui_updated import *
-from PySide6.QtWidgets import QFileDialog, QVBoxLayout, QMessageBox, QMainWindow, QLabel, QApplication, QDialog, QPushButton
-from PySide6.QtCore import Qt
-import glob
+from PySide6.QtWidgets import QFileDialog, QVBoxLayout, QMessageBox, QMainWindow, QLabel, QApplication, QDialog, QPushButton, QSpinBox
+from PySide6.QtCore import Qt, QObject, QThread, Signal
 import os
 import re
 import statistics
 import sys
-import spacy
-import matplotlib.pyplot as plt
-import pandas as pd
-import numpy as np
+import threading
 
-nlp = spacy.load('en_core_web_sm')
+# The extractors and the corpus loop live in GUI-free modules so they can run headless.
+# Only the light ones are imported here: npca_engine pulls in spaCy and is imported, with the
+# model, by ModelLoader once the window is up; pandas and matplotlib only by plot_bar_graph.
+from npca_features import *
+from npca_profile import RunProfile
 
-def normed(count, word_count):
-    return round(count / word_count * 1000, 2) if word_count else 0
-
-def sorted_text(tokens):
-    return " ".join(tok.text for tok in sorted(set(tokens), key=lambda x: x.i))
-
-def count_adj(doc):
-    """
-    Attributive adjectives as premodifiers.
-    e.g.,
-        a nice flavor
-        the red car
-
-    Excludes predicative adjectives:
-        e.g., the car is nice
-    """
-    results = []
-
-    for head in doc:
-        if head.pos_ not in {"NOUN", "PRON"}:
-            continue
-
-        for child in head.lefts:
-            # adjectival modifier directly attached to noun
-            if child.dep_ == "amod" and child.pos_ == "ADJ":
-                results.append(f"{child.text} {head.text}")
-
-    return results
-
-def count_rc(doc):
-    """
-    Count finite relative clauses modifying nouns/pronouns.
-    e.g.,
-        the man who was nice to me
-        the book that I bought
-        the person who lives next door
-
-    """
-    results = []
-    relativizers = {"who", "which", "that", "whom", "whose"}
-
-    for head in doc:
-        if head.pos_ not in {"NOUN", "PRON"}:
-            continue
-
-        # Search descendants / nearby right dependents for a relativizer
-        # that introduces a finite clause attached to this noun.
-        for child in head.rights:
-            # Case 1: relativizer directly attached near the noun
-            if child.text.lower() in relativizers:
-                # Look for a finite verb / auxiliary associated with the clause
-                clause_tokens = [child] + list(child.subtree)
-                has_finite_verb = any(
-                    tok.pos_ in {"VERB", "AUX"} and tok.tag_ not in {"VBG", "VBN", "VB"}
-                    for tok in clause_tokens
-                )
-                if has_finite_verb:
-                    phrase = " ".join(tok.text for tok in sorted(set(clause_tokens), key=lambda x: x.i))
-                    results.append(f"{head.text} {phrase}".strip())
-
-            # Case 2: clause attached as acl/relcl to the noun
-            elif child.dep_ in {"acl", "relcl"}:
-                subtree = list(child.subtree)
-
-                has_relativizer = any(tok.text.lower() in relativizers for tok in subtree)
-                has_finite_verb = any(
-                    tok.pos_ in {"VERB", "AUX"} and tok.tag_ not in {"VBG", "VBN", "VB"}
-                    for tok in subtree
-                )
-
-                if has_relativizer and has_finite_verb:
-                    phrase = " ".join(tok.text for tok in subtree)
-                    results.append(f"{head.text} {phrase}".strip())
-
-    return results
-
-def count_nm(doc):
-    """
-    Nouns as premodifiers.
-
-    e.g.,
-        cable channel
-        school teacher
-        government report
-    """
-    results = []
-
-    for head in doc:
-        if head.pos_ not in {"NOUN", "PRON"}:
-            continue
-
-        for child in head.lefts:
-            if child.pos_ == "NOUN" and child.dep_ == "compound":
-                results.append(f"{child.text} {head.text}")
-
-    return results
-
-def count_poss(doc):
-    """
-    Possessive nouns as premodifiers.
-
-    e.g.,
-        Mary's voice
-        the student's book
-        John's car
-    """
-    results = []
-
-    for head in doc:
-        if head.pos_ not in {"NOUN", "PRON"}:
-            continue
-
-        for child in head.lefts:
-            if child.dep_ == "poss":
-                results.append(f"{child.text} {head.text}")
-
-    return results
-
-def count_of(doc):
-    """
-    Of-phrases as noun postmodifiers.
-    Examples:
-        chair of the committee
-        the end of the road
-    """
-    results = []
-
-    for head in doc:
-        if head.pos_ not in {"NOUN", "PRON"}:
-            continue
-
-        for child in head.children:
-            # prepositional dependent headed by "of"
-            if child.dep_ == "prep" and child.text.lower() == "of":
-                phrase = sorted_text(child.subtree)
-                results.append(f"{head.text} {phrase}")
-    return results
-
-
-def count_prep(doc):
-    """
-    Simple prepositional phrases as postmodifiers of nouns,
-    excluding of-phrases
-
-    e.g.,
-        house in the country
-        students with good grades
-        the book on the table
-    """
-    results = []
-
-    for head in doc:
-        if head.pos_ not in {"NOUN", "PRON"}:
-            continue
-
-        for child in head.children:
-            if child.dep_ == "prep" and child.text.lower() != "of":
-                phrase = " ".join(tok.text for tok in child.subtree)
-                results.append(f"{head.text} {phrase}")
-
-    return results
-
-def count_nonf(doc):
-    """
-    Nonfinite relative clauses as postmodifiers.
-    e.g.,
-        students studying abroad
-        the method used in the experiment
-        a book written by Orwell
-
-    Targets participial clause postmodifiers attached to nouns.
-    """
-    results = []
-
-    for head in doc:
-        if head.pos_ not in {"NOUN", "PRON"}:
-            continue
-
-        for child in head.children:
-            # participial clausal modifier of the noun
-            if child.dep_ == "acl" and child.tag_ in {"VBG", "VBN"}:
-                phrase = sorted_text(child.subtree)
-                results.append(f"{head.text} {phrase}")
-
-    return results
-
-def count_adj_nm(doc):
+class ModelLoader(QObject):
     """
-    Multiple premodifiers: adjective + noun + head noun
-    e.g.,
-        medical school teacher
-        large government report
-
-    Requires at least one adjectival premodifier and one noun premodifier attached to the same head noun.
+    Imports the engine and loads the spaCy model on a background thread, so the
+    window shows right away. The outcome is reported through signals.
     """
-    results = []
-
-    for head in doc:
-        if head.pos_ not in {"NOUN", "PRON"}:
-            continue
-
-        adjs = []
-        nouns = []
-
-        for child in head.lefts:
-            if child.dep_ == "amod" and child.pos_ == "ADJ":
-                adjs.append(child)
-            elif child.dep_ == "compound" and child.pos_ == "NOUN":
-                nouns.append(child)
+    loaded = Signal()
+    failed = Signal(str)
 
-        if adjs and nouns:
-            phrase_tokens = adjs + nouns + [head]
-            phrase = sorted_text(phrase_tokens)
-            results.append(phrase)
+    def start(self):
+        threading.Thread(target=self._run, name='npca-model-loader', daemon=True).start()
 
-    return results
-
-def count_comp(doc):
-    """
-    Count noun complement clauses used as postmodifiers.
-    e.g.,
-        the fact that he left
-        the idea that we should wait
-        a chance to win
-        permission to leave
-
-    - Includes both that-clause complements and to-infinitive complements.
+    def _run(self):
+        try:
+            from npca_engine import load_model
+            load_model()
+        except Exception as e:
+            print(f'Error: {e}')
+            self.failed.emit(str(e))
+            return
+        self.loaded.emit()
 
+class AnalysisWorker(QObject):
     """
-    results = []
-
-    for head in doc:
-        if head.pos_ not in {"NOUN", "PRON"}:
-            continue
-
-        for child in head.rights:
-            # 1) that-clause complement:
-            if child.text.lower() == "that" and child.pos_ == "SCONJ" and child.dep_ == "mark":
-                clause_head = child.head
-
-                # Make sure this clause is linked back to the noun
-                if clause_head.i > head.i:
-                    subtree = list(clause_head.subtree)
-
-                    has_finite_verb = any(
-                        tok.pos_ in {"VERB", "AUX"} and tok.tag_ not in {"VBG", "VBN", "VB"}
-                        for tok in subtree
-                    )
-                    has_relativizer = any(
-                        tok.text.lower() in {"who", "which", "whom", "whose"}
-                        for tok in subtree
-                    )
-
-                    if has_finite_verb and not has_relativizer:
-                        phrase = " ".join(tok.text for tok in subtree)
-                        results.append(f"{head.text} {phrase}".strip())
-
-            # 2) to-infinitive complement:
-            elif child.dep_ == "acl" and child.tag_ == "VB":
-                subtree = list(child.subtree)
-                has_to = any(tok.text.lower() == "to" and tok.dep_ == "aux" for tok in subtree)
-                if has_to:
-                    phrase = " ".join(tok.text for tok in subtree)
-                    results.append(f"{head.text} {phrase}".strip())
-
-            # where spaCy labels infinitival postmodifiers differently
-            elif child.dep_ == "acl" and child.pos_ == "VERB":
-                subtree = list(child.subtree)
-                has_to = any(tok.text.lower() == "to" for tok in subtree)
-                is_nonfinite = child.tag_ == "VB"
-                if has_to and is_nonfinite:
-                    phrase = " ".join(tok.text for tok in subtree)
-                    results.append(f"{head.text} {phrase}".strip())
-    return results
-
-def count_ml(doc):
-    """
-    Multiple prepositional phrase embeddings as postmodifiers.
-    e.g.,
-        the development of structural complexity through recursive expansion
-        the presence of layered structures at the borderline of cell territories
-
-    This function identifies noun heads followed by a PP postmodifier
-    whose object contains another PP, indicating embedded PP structure.
+    Runs the corpus loop on a background QThread so the window stays responsive.
+    Progress and the outcome are reported back to the UI thread through signals.
     """
-    results = []
+    progress = Signal(int, int)  # files done, total files
+    finished = Signal(int, bool)  # files written, whether the run was cancelled
+    failed = Signal(str)
+
+    def __init__(self, input_folder, output_file_path, selected_columns, profile=None, pool=None):
+        super().__init__()
+        self.input_folder = input_folder
+        self.output_file_path = output_file_path
+        self.selected_columns = selected_columns
+        self.profile = profile
+        self.pool = pool
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    def run(self):
+        from npca_cache import DEFAULT_CACHE_DIR
+        from npca_engine import load_model, run_corpus
 
-    for head in doc:
-        if head.pos_ not in {"NOUN", "PRON"}:
-            continue
+        try:
+            # Parses are cached so re-running a folder with other checkboxes does not parse it again
+            done = run_corpus(self.input_folder, self.output_file_path, self.selected_columns, nlp=load_model(),
+                              progress_callback=self.progress.emit, cache_dir=DEFAULT_CACHE_DIR,
+                              should_stop=self.should_stop, profile=self.profile, pool=self.pool)
+        except Exception as e:
+            print(f'Error: {e}')
+            self.failed.emit(str(e))
+            return
+        self.finished.emit(done, self._cancelled.is_set())
 
-        for prep in head.children:
-            if prep.dep_ != "prep":
-                continue
+    def should_stop(self):
+        # Called by the engine between files; blocks here while the run is paused
+        self._running.wait()
+        return self._cancelled.is_set()
 
-            found_embedding = False
-            phrase_tokens = [head] + list(prep.subtree)
+    def pause(self):
+        self._running.clear()
 
-            # Find object of the first PP
-            for pobj in prep.children:
-                if pobj.dep_ == "pobj":
-                    # Check whether the object itself has another PP
-                    for child in pobj.children:
-                        if child.dep_ == "prep":
-                            found_embedding = True
-                            phrase_tokens.extend(list(child.subtree))
+    def resume(self):
+        self._running.set()
 
-            if found_embedding:
-                phrase = " ".join(
-                    tok.text for tok in sorted(set(phrase_tokens), key=lambda x: x.i)
-                )
-                results.append(phrase)
+    def is_paused(self):
+        return not self._running.is_set()
 
-    return results
+    def cancel(self):
+        self._cancelled.set()
+        self._running.set()
 
 class NPCInfoDialog(QDialog):
     def __init__(self, parent=None):
@@ -416,6 +175,48 @@ class MainWindow(QMainWindow, Ui_MainWindow):  # https://docs.python.org/3/tutor
         self.input_folder = ""
         self.output_folder = ""
 
+        # Pause and cancel controls for a running analysis, next to the start button
+        self.pauseButton = QPushButton("Pause", self.frame_4)
+        self.pauseButton.setGeometry(415, 478, 80, 28)
+        self.pauseButton.setEnabled(False)
+        self.pauseButton.clicked.connect(self.toggle_pause)
+        self.cancelButton = QPushButton("Cancel", self.frame_4)
+        self.cancelButton.setGeometry(500, 478, 80, 28)
+        self.cancelButton.setEnabled(False)
+        self.cancelButton.clicked.connect(self.cancel_process)
+        self.worker = None
+        self.worker_thread = None
+
+        # Opt-in timing of the run, saved next to the CSV and summarised when it finishes
+        self.profileCheckBox = QCheckBox("Profile the run (timings)", self.frame_4)
+        self.profileCheckBox.setGeometry(420, 380, 181, 21)
+
+        # Worker processes for the analysis; with more than one, they are kept for later runs
+        self.processesLabel = QLabel("Worker processes:", self.frame_4)
+        self.processesLabel.setGeometry(420, 400, 115, 21)
+        self.processesSpinBox = QSpinBox(self.frame_4)
+        self.processesSpinBox.setGeometry(535, 400, 50, 21)
+        self.processesSpinBox.setRange(1, os.cpu_count() or 1)
+        self.pool = None
+
+        # The start button waits for the model, which loads in the background
+        self.model_ready = False
+        self.pushButton.setText("Loading model...")
+        self.pushButton.setEnabled(False)
+        self.model_loader = ModelLoader()
+        self.model_loader.loaded.connect(self.on_model_loaded)
+        self.model_loader.failed.connect(self.on_model_failed)
+        self.model_loader.start()
+
+    def on_model_loaded(self):
+        self.model_ready = True
+        self.pushButton.setText("Start the analysis")
+        self.pushButton.setEnabled(True)
+
+    def on_model_failed(self, message):
+        self.pushButton.setText("Model not loaded")
+        QMessageBox.critical(self, 'Error', f'Error loading the spaCy model: {message}')
+
     def set_input_folder(self):
         # The folder selected will be opened
         selected_folder = QFileDialog.getExistingDirectory(self, 'Select Folder')
@@ -429,9 +230,21 @@ class MainWindow(QMainWindow, Ui_MainWindow):  # https://docs.python.org/3/tutor
             self.output_folder = selected_folder
 
     def get_all_columns(self):
-        return ['adj_raw', 'adj_normed', 'rc_raw', 'rc_normed', 'nm_raw', 'nm_normed', 'poss_raw', 'poss_normed',
-                'of_raw', 'of_normed', 'prep_raw', 'prep_normed', 'nonf_raw', 'nonf_normed', 'adj_nm_raw',
-                'adj_nm_normed', 'comp_raw', 'comp_normed', 'ml_raw', 'ml_normed']
+        from npca_engine import get_all_columns
+        return get_all_columns()
+
+    def get_selected_features(self):
+        from npca_engine import STAGES
+        features = []
+        if self.checkBox_3.isChecked():  # Stage 2
+            features.extend(STAGES[2])
+        if self.checkBox_4.isChecked():  # Stage 3
+            features.extend(STAGES[3])
+        if self.checkBox_5.isChecked():  # Stage 4
+            features.extend(STAGES[4])
+        if self.checkBox_6.isChecked():  # Stage 5
+            features.extend(STAGES[5])
+        return features
 
     # Defining a function
     def run_process(self):
@@ -441,41 +254,11 @@ class MainWindow(QMainWindow, Ui_MainWindow):  # https://docs.python.org/3/tutor
         if not self.output_folder:
             QMessageBox.warning(self, 'Warning', 'Please select an output folder using "Find Folder" button.')
 
-        selected_columns = []
-        all_columns = self.get_all_columns()
+        from npca_engine import select_columns
+
         freq_raw = self.checkBox.isChecked()
         freq_normed = self.checkBox_2.isChecked()
-
-        if self.checkBox_3.isChecked():
-            if freq_raw:
-                selected_columns.append('adj_raw')
-            if freq_normed:
-                selected_columns.append('adj_normed')
-        if self.checkBox_4.isChecked():  # Stage 3
-            stage3 = ['rc', 'nm', 'poss', 'of', 'prep']
-            for prefix in stage3:
-                if freq_raw:
-                    selected_columns.append(f'{prefix}_raw')
-                if freq_normed:
-                    selected_columns.append(f'{prefix}_normed')
-
-        if self.checkBox_5.isChecked():  # Stage 4
-            stage4 = ['nonf', 'adj_nm']
-            for prefix in stage4:
-                if freq_raw:
-                    selected_columns.append(f'{prefix}_raw')
-                if freq_normed:
-                    selected_columns.append(f'{prefix}_normed')
-
-        if self.checkBox_6.isChecked():  # Stage 5
-            stage5 = ['comp', 'ml']
-            for prefix in stage5:
-                if freq_raw:
-                    selected_columns.append(f'{prefix}_raw')
-                if freq_normed:
-                    selected_columns.append(f'{prefix}_normed')
-
-        selected_columns = sorted(set(selected_columns))
+        selected_columns = select_columns(self.get_selected_features(), freq_raw, freq_normed)
         if not selected_columns:
             QMessageBox.warning(self, 'Warning', 'Please select at least one checkbox before running the analysis.')
             return
@@ -487,82 +270,116 @@ class MainWindow(QMainWindow, Ui_MainWindow):  # https://docs.python.org/3/tutor
 
         self.pushButton.setText("Processing...")
         self.pushButton.setEnabled(False)
+        self.pauseButton.setText("Pause")
+        self.pauseButton.setEnabled(True)
+        self.cancelButton.setEnabled(True)
         self.progressBar.setValue(0)
-        QApplication.processEvents()
-
-        try:
-            print('Before opening the output file')
-            with open(output_file_path, 'w+', encoding='utf-8') as out_file:
-                header = ['file', 'Number of words'] + selected_columns
-                out_file.write(','.join(header) + '\n')
-
-                file_list = glob.glob(os.path.join(self.input_folder, '*'))
-                total_files = len(file_list)
-
-
-                for i, file_name in enumerate(file_list):
-                    # Open each file here
-                    with open(file_name, encoding = 'utf-8', errors = 'ignore') as file:
-                        text = file.read()
-                        words = text.split()
-                        word_count = len(words)
-                        doc = nlp(text)
-
-                        adj = count_adj(doc)
-                        rc = count_rc(doc)
-                        nm = count_nm(doc)
-                        poss = count_poss(doc)
-                        of = count_of(doc)
-                        prep = count_prep(doc)
-                        nonf = count_nonf(doc)
-                        adj_nm = count_adj_nm(doc)
-                        comp = count_comp(doc)
-                        ml = count_ml(doc)
-
-                        # Compute counts and normed freqs
-                        results = {
-                            'adj_raw': len(adj), 'adj_normed': normed(len(adj), word_count),
-                            'rc_raw': len(rc), 'rc_normed': normed(len(rc), word_count),
-                            'nm_raw': len(nm), 'nm_normed': normed(len(nm), word_count),
-                            'poss_raw': len(poss), 'poss_normed': normed(len(poss), word_count),
-                            'of_raw': len(of), 'of_normed': normed(len(of), word_count),
-                            'prep_raw': len(prep), 'prep_normed': normed(len(prep), word_count),
-                            'nonf_raw': len(nonf), 'nonf_normed': normed(len(nonf), word_count),
-                            'adj_nm_raw': len(adj_nm), 'adj_nm_normed': normed(len(adj_nm), word_count),
-                            'comp_raw': len(comp), 'comp_normed': normed(len(comp), word_count),
-                            'ml_raw': len(ml), 'ml_normed': normed(len(ml), word_count)
-                        }
-
-                        row = [os.path.basename(file_name), str(word_count)]
-                        for col in selected_columns:
-                            row.append(str(results.get(col, 0)))
-                        out_file.write(','.join(row) + '\n')
-
-                    # Update progress bar
-                    progress = int((i + 1) / total_files * 100)
-                    self.progressBar.setValue(progress)
-                    QApplication.processEvents()
-
-            self.progressBar.setValue(100)
-            QMessageBox.information(self, 'Success', f'CSV file "{output_file_path}" generated successfully.')
-
-            if self.checkBox_7.isChecked():
-                self.plot_bar_graph()
-
-        except Exception as e:
-            print(f'Error: {e}')
-            # Inform user about the error
-            QMessageBox.critical(self, 'Error', f'Error generating CSV file: {str(e)}')
+        self.current_output_file_path = output_file_path
+
+        print('Before opening the output file')
+        self.worker_thread = QThread(self)
+        profile = RunProfile() if self.profileCheckBox.isChecked() else None
+        self.worker = AnalysisWorker(self.input_folder, output_file_path, selected_columns, profile,
+                                     self.get_pool(self.processesSpinBox.value()))
+        self.worker.moveToThread(self.worker_thread)
+        self.worker_thread.started.connect(self.worker.run)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.finished.connect(self.on_process_finished)
+        self.worker.failed.connect(self.on_process_failed)
+        self.worker.finished.connect(self.worker_thread.quit)
+        self.worker.failed.connect(self.worker_thread.quit)
+        self.worker_thread.finished.connect(self.worker.deleteLater)
+        self.worker_thread.finished.connect(self.worker_thread.deleteLater)
+        self.worker_thread.start()
+
+    def get_pool(self, n_process):
+        # The pool is forked from this process, which already has the model, and reused by
+        # every run until the number of processes changes
+        from npca_engine import WorkerPool
+
+        if self.pool is not None and self.pool.n_process != n_process:
+            self.pool.close()
+            self.pool = None
+        if self.pool is None and n_process > 1:
+            self.pool = WorkerPool(n_process)
+        return self.pool
+
+    def update_progress(self, done, total):
+        # Update progress bar
+        progress = int(done / total * 100)
+        self.progressBar.setValue(progress)
+
+    def toggle_pause(self):
+        if self.worker is None:
+            return
+        if self.worker.is_paused():
+            self.worker.resume()
+            self.pauseButton.setText("Pause")
+            self.pushButton.setText("Processing...")
+        else:
+            self.worker.pause()
+            self.pauseButton.setText("Resume")
+            self.pushButton.setText("Paused")
+
+    def cancel_process(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            self.cancelButton.setEnabled(False)
+            self.pushButton.setText("Cancelling...")
+
+    def on_process_finished(self, done, cancelled):
+        profile = self.worker.profile
+        self.reset_run_controls()
+        output_file_path = self.current_output_file_path
+        if cancelled:
+            QMessageBox.information(self, 'Cancelled',
+                                    f'Analysis cancelled. "{output_file_path}" contains the first {done} files.')
+            return
 
+        self.progressBar.setValue(100)
+        message = f'CSV file "{output_file_path}" generated successfully.'
+        if profile is not None:
+            message += f'\n\nProfile (details in the .profile.json/.csv files next to it):\n{profile.summary()}'
+        QMessageBox.information(self, 'Success', message)
+
+        if self.checkBox_7.isChecked():
+            self.plot_bar_graph()
+
+    def on_process_failed(self, message):
+        self.reset_run_controls()
+        # Inform user about the error
+        QMessageBox.critical(self, 'Error', f'Error generating CSV file: {message}')
+
+    def reset_run_controls(self):
+        self.worker = None
+        self.worker_thread = None
+        self.pauseButton.setText("Pause")
+        self.pauseButton.setEnabled(False)
+        self.cancelButton.setEnabled(False)
         self.pushButton.setText("Start the analysis")
         self.pushButton.setEnabled(True)
 
+    def closeEvent(self, event):
+        # Stop a running analysis before the window goes away
+        if self.worker_thread is not None:
+            self.worker.cancel()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        super().closeEvent(event)
+
     def show_npc_info(self):
         dialog = NPCInfoDialog(self)
         dialog.exec()
 
     def plot_bar_graph(self):
         try:
+            # Imported on first use: they take longer to import than the rest of the window
+            import matplotlib.pyplot as plt
+            import pandas as pd
+
             # Only run if checkbox is checked
             if not self.checkBox_7.isChecked():
                 return
@@ -0,0 +1,328 @@
+############# NPC Analyzer: benchmarks ##############
+# Throughput benchmark on a deterministic synthetic corpus.
+# Reports words per second for parsing and for each count_* extractor (plus the fused
+# extract_all, the count-only count_all and count_all_vectorized, the rule engine and the
+# match store), the memory held by phrase lists and by match stores, files per second for
+# the whole corpus loop, and peak memory, and writes the results as JSON so that runs can be
+# compared over time.
+# --startup instead times start-up in fresh interpreters: importing the headless modules, and
+# launching the GUI until its window is shown and until its model is loaded.
+# e.g.,
+#   python npca_bench.py -o bench.json
+#   python npca_bench.py --sizes 200 2000 20000 --files 5 --repeat 3 -o bench.json
+#   python npca_bench.py --check    (only cross-check the vectorized, rule and match store results on the corpus)
+#   python npca_bench.py --startup --repeat 5 -o startup.json
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import spacy
+
+from npca_engine import MODEL_NAME, get_all_columns, load_model, run_corpus
+from npca_features import EXTRACTORS, FEATURES, count_all, extract_all
+from npca_matches import MatchStore
+from npca_profile import peak_rss_mb
+from npca_rules import RuleSet
+from npca_vector import count_all_vectorized, cross_check
+
+DEFAULT_SIZES = [200, 2000, 20000]
+
+# Modules whose import time --startup reports, lightest first
+STARTUP_MODULES = ['npca_features', 'npca_engine', 'npca_cli', 'noun_phrase_complexity_analyzer_v2']
+
+# Run in a fresh interpreter by --startup: opens the GUI and prints a line when the window has
+# been shown and another when the model has loaded (or failed to)
+_GUI_STARTUP = '''
+import sys
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QApplication, QMessageBox
+import noun_phrase_complexity_analyzer_v2 as gui
+QMessageBox.critical = staticmethod(lambda *args: print('failed', flush=True))
+app = QApplication(sys.argv)
+window = gui.MainWindow()
+window.show()
+app.processEvents()
+print('shown', flush=True)
+def poll():
+    if window.model_ready:
+        print('ready', flush=True)
+    if window.model_ready or window.pushButton.text() == 'Model not loaded':
+        app.quit()
+timer = QTimer()
+timer.timeout.connect(poll)
+timer.start(5)
+app.exec()
+'''
+
+_ADJS = ['nice', 'large', 'recent', 'complex', 'structural', 'medical', 'positive', 'careful', 'local', 'new']
+_NOUNS = ['report', 'teacher', 'method', 'study', 'effect', 'structure', 'committee', 'school', 'government',
+          'size', 'development', 'presence', 'territory', 'hypothesis', 'student', 'house', 'country', 'idea']
+_NAMES = ['Mary', 'John', 'the author', 'the student']
+_PREPS = ['in', 'with', 'on', 'at', 'through', 'for']
+
+# Sentence templates covering the ten structures, plus plain filler
+_TEMPLATES = [
+    'The {adj} {noun} was {adj2}.',
+    'The {noun} that {name} wrote was about the {noun2}.',
+    'This {noun2} {noun} describes a {noun3}.',
+    "{name}'s {noun} surprised the {noun2}.",
+    'The chair of the {noun} read the {noun2} of the {noun3}.',
+    'We visited a {noun} {prep} the {noun2}.',
+    'Studies adopting this {noun} were published.',
+    'A {adj} {noun2} {noun} was used in the {noun3}.',
+    'The {noun} that the {noun2} was {adj} remained open.',
+    'They had a chance to win the {noun}.',
+    'The presence of {adj} structures at the borderline of {noun} territories was noted.',
+    'It rained all day and we stayed inside.',
+]
+
+
+def synthetic_text(rng, n_words):
+    """
+    Build a text of at least n_words words from the sentence templates.
+    """
+    sentences = []
+    words = 0
+    while words < n_words:
+        template = rng.choice(_TEMPLATES)
+        sentence = template.format(
+            adj=rng.choice(_ADJS), adj2=rng.choice(_ADJS), noun=rng.choice(_NOUNS), noun2=rng.choice(_NOUNS),
+            noun3=rng.choice(_NOUNS), name=rng.choice(_NAMES), prep=rng.choice(_PREPS))
+        sentence = sentence[0].upper() + sentence[1:]
+        sentences.append(sentence)
+        words += len(sentence.split())
+        # Paragraph break every few sentences, as in real essays
+        if len(sentences) % 6 == 0:
+            sentences.append('\n\n')
+    return ' '.join(sentences).replace(' \n\n ', '\n\n')
+
+
+def synthetic_corpus(sizes=DEFAULT_SIZES, files_per_size=3, seed=0):
+    """
+    [(file_name, text)] with files_per_size texts of each size in words.
+    The same arguments always give the same corpus.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for size in sizes:
+        for i in range(files_per_size):
+            corpus.append((f'synthetic_{size}_{i:03d}.txt', synthetic_text(rng, size)))
+    return corpus
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def rate(amount, seconds):
+    return round(amount / seconds, 1) if seconds else None
+
+
+def _launch(code, env=None):
+    # Seconds from launching a fresh interpreter on code to each line it prints, and to its exit
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env)
+    marks = {}
+    for line in child.stdout:
+        marks[line.strip()] = time.perf_counter() - start
+    if child.wait() != 0:
+        raise RuntimeError(f'exit status {child.returncode}')
+    marks['exit'] = time.perf_counter() - start
+    return marks
+
+
+def startup_benchmarks(repeat=3):
+    """
+    Best-of-repeat start-up times in seconds, each measured in a fresh
+    interpreter from launch: the bare interpreter, importing each of
+    STARTUP_MODULES, and the GUI until its window is shown and until its
+    model is loaded. A measurement that cannot run gives its error instead.
+    """
+    def best(code, mark='exit', env=None):
+        try:
+            return round(min(_launch(code, env)[mark] for _ in range(repeat)), 4)
+        except KeyError:
+            return {'error': f'never reached "{mark}"'}
+        except (OSError, RuntimeError) as e:
+            return {'error': str(e)}
+
+    results = {'python': best('pass')}
+    results['imports'] = {module: best(f'import {module}') for module in STARTUP_MODULES}
+    env = dict(os.environ)
+    if sys.platform.startswith('linux') and not env.get('DISPLAY') and not env.get('WAYLAND_DISPLAY'):
+        env['QT_QPA_PLATFORM'] = 'offscreen'
+    results['gui'] = {'window_shown': best(_GUI_STARTUP, 'shown', env),
+                      'model_ready': best(_GUI_STARTUP, 'ready', env)}
+    return results
+
+
+def match_memory(docs):
+    """
+    Bytes held by the matches of docs: as the phrase lists of extract_all
+    (lists and strings) and as match stores (their row buffers).
+    """
+    phrase_bytes = store_bytes = matches = 0
+    for doc in docs:
+        for phrases in extract_all(doc).values():
+            phrase_bytes += sys.getsizeof(phrases) + sum(sys.getsizeof(phrase) for phrase in phrases)
+            matches += len(phrases)
+        store_bytes += MatchStore.from_doc(doc).nbytes
+    return {'matches': matches, 'phrase_list_bytes': phrase_bytes, 'match_store_bytes': store_bytes}
+
+
+def run_benchmarks(nlp, corpus, repeat=3, batch_size=16, n_process=1, model_name=MODEL_NAME):
+    texts = [text for _, text in corpus]
+    total_words = sum(len(text.split()) for text in texts)
+    results = {}
+
+    parse_seconds = best_time(lambda: list(nlp.pipe(texts, batch_size=batch_size)), repeat)
+    results['parse'] = {'seconds': round(parse_seconds, 4), 'words_per_second': rate(total_words, parse_seconds)}
+
+    docs = list(nlp.pipe(texts, batch_size=batch_size))
+    extractors = {}
+    for feature in FEATURES:
+        extractor = EXTRACTORS[feature]
+        seconds = best_time(lambda: [extractor(doc) for doc in docs], repeat)
+        extractors[extractor.__name__] = {'seconds': round(seconds, 4), 'words_per_second': rate(total_words, seconds)}
+    seconds = best_time(lambda: [extract_all(doc) for doc in docs], repeat)
+    extractors['extract_all'] = {'seconds': round(seconds, 4), 'words_per_second': rate(total_words, seconds)}
+    seconds = best_time(lambda: [count_all(doc) for doc in docs], repeat)
+    extractors['count_all'] = {'seconds': round(seconds, 4), 'words_per_second': rate(total_words, seconds)}
+    seconds = best_time(lambda: [count_all_vectorized(doc) for doc in docs], repeat)
+    extractors['count_all_vectorized'] = {'seconds': round(seconds, 4),
+                                          'words_per_second': rate(total_words, seconds)}
+    rules = RuleSet.from_file(nlp.vocab)
+    seconds = best_time(lambda: [rules.count(doc) for doc in docs], repeat)
+    extractors['rules'] = {'seconds': round(seconds, 4), 'words_per_second': rate(total_words, seconds)}
+    seconds = best_time(lambda: [MatchStore.from_doc(doc) for doc in docs], repeat)
+    extractors['match_store'] = {'seconds': round(seconds, 4), 'words_per_second': rate(total_words, seconds)}
+    results['extractors'] = extractors
+    results['match_memory'] = match_memory(docs)
+    del docs
+
+    # End to end: the corpus loop reading files from disk and writing the CSV
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_folder = os.path.join(tmp_dir, 'corpus')
+        os.makedirs(input_folder)
+        for file_name, text in corpus:
+            with open(os.path.join(input_folder, file_name), 'w', encoding='utf-8') as file:
+                file.write(text)
+        output_file_path = os.path.join(tmp_dir, 'bench.csv')
+
+        def corpus_loop():
+            run_corpus(input_folder, output_file_path, sorted(get_all_columns()), nlp=nlp, model_name=model_name,
+                       batch_size=batch_size, n_process=n_process)
+
+        tracemalloc.start()
+        seconds = best_time(corpus_loop, repeat)
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    results['corpus_loop'] = {
+        'seconds': round(seconds, 4),
+        'files_per_second': rate(len(corpus), seconds),
+        'words_per_second': rate(total_words, seconds),
+        'batch_size': batch_size,
+        'n_process': n_process,
+        'python_peak_mb': round(traced_peak / (1024 * 1024), 1),
+    }
+    results['peak_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Benchmark parsing and NP structure extraction throughput.')
+    parser.add_argument('-o', '--output', help='JSON file to write the results to (default: print them)')
+    parser.add_argument('--model', default=MODEL_NAME, help=f'spaCy pipeline to load (default: {MODEL_NAME})')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='text lengths in words (default: %(default)s)')
+    parser.add_argument('--files', type=int, default=3, help='texts per size (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic corpus (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='timing repetitions, best is kept (default: %(default)s)')
+    parser.add_argument('--batch-size', type=int, default=16, help='nlp.pipe batch size (default: %(default)s)')
+    parser.add_argument('-j', '--n-process', type=int, default=1,
+                        help='worker processes for the corpus loop (default: %(default)s)')
+    parser.add_argument('--startup', action='store_true',
+                        help='only time start-up (module imports, GUI window and model load) in fresh interpreters')
+    parser.add_argument('--check', action='store_true',
+                        help='only check that the vectorized and rule counts, and the match store counts and '
+                             'phrases, equal the count_* functions on the corpus')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.startup:
+        report = {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat,
+            'startup_seconds': startup_benchmarks(args.repeat),
+        }
+        _write_report(report, args.output)
+        return 0
+
+    start = time.perf_counter()
+    nlp = load_model(args.model)
+    load_seconds = time.perf_counter() - start
+
+    corpus = synthetic_corpus(args.sizes, args.files, args.seed)
+    if args.check:
+        docs = list(nlp.pipe((text for _, text in corpus), batch_size=args.batch_size))
+        rules = RuleSet.from_file(nlp.vocab)
+        mismatches = []
+        for name, counter in [('vectorized', count_all_vectorized), ('rules', rules.count)]:
+            for i, feature, expected, got in cross_check(docs, counter=counter):
+                print(f'{corpus[i][0]}: {feature} count_* {expected}, {name} {got}', file=sys.stderr)
+                mismatches.append((name, i, feature))
+        for i, doc in enumerate(docs):
+            store = MatchStore.from_doc(doc)
+            for feature in FEATURES:
+                if store.phrases(doc, feature) != EXTRACTORS[feature](doc):
+                    print(f'{corpus[i][0]}: {feature} phrases differ in the match store', file=sys.stderr)
+                    mismatches.append(('match_store', i, feature))
+        print(f'{len(corpus)} texts checked, {len(mismatches)} mismatches')
+        return 1 if mismatches else 0
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'spacy': spacy.__version__,
+        'model': f"{nlp.meta.get('lang', '')}_{nlp.meta.get('name', '')}-{nlp.meta.get('version', '')}",
+        'corpus': {'sizes': args.sizes, 'files_per_size': args.files, 'seed': args.seed,
+                   'files': len(corpus), 'words': sum(len(text.split()) for _, text in corpus)},
+        'repeat': args.repeat,
+        'model_load_seconds': round(load_seconds, 4),
+    }
+    report.update(run_benchmarks(nlp, corpus, args.repeat, args.batch_size, args.n_process, args.model))
+    _write_report(report, args.output)
+    return 0
+
+
+def _write_report(report, output):
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+############# NPC Analyzer: parse cache ##############
+# On-disk cache of parsed Docs so that re-running a corpus (e.g. with another stage
+# selection or output name) does not parse every file again.
+# Each entry is a single-Doc spaCy DocBin stored as <cache_dir>/<key[:2]>/<key>.spacy, where
+# the key hashes the text together with the model name, version and active components.
+# The cache is bounded in bytes; the least recently used entries are evicted first, down to
+# a low-water mark, so that the directory is only rescanned once every few thousand parses.
+
+import hashlib
+import os
+
+from spacy.tokens import DocBin
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.npca_cache')
+DEFAULT_CACHE_SIZE = 1024 * 1024 * 1024  # bytes
+# Share of max_bytes an eviction frees the cache down to
+EVICT_TO = 0.9
+
+_SUFFIX = '.spacy'
+
+
+def model_signature(nlp, disabled=()):
+    """
+    Identify the annotations a pipeline produces: model name and version plus
+    the components that actually run.
+    """
+    meta = nlp.meta
+    active = [name for name in nlp.pipe_names if name not in disabled]
+    return f"{meta.get('lang', '')}_{meta.get('name', '')}-{meta.get('version', '')}:{','.join(active)}"
+
+
+class ParseCache:
+    """
+    Size-bounded LRU store of parsed Docs keyed by text content and model.
+
+    Several processes may share one cache directory: entries are written
+    atomically and a missing entry is treated as a cache miss.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.size = sum(size for _, size, _ in self._entries())
+
+    def key(self, text, signature):
+        digest = hashlib.sha256()
+        digest.update(signature.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + _SUFFIX)
+
+    def _entries(self):
+        # (path, size, mtime) of every entry currently on disk
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(_SUFFIX):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def get(self, key, vocab):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        # The modification time doubles as the last-used time for LRU eviction
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return next(DocBin().from_bytes(data).get_docs(vocab))
+
+    def put(self, key, doc):
+        doc_bin = DocBin(store_user_data=False)
+        doc_bin.add(doc)
+        data = doc_bin.to_bytes()
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Delete least recently used entries until the cache fits in EVICT_TO of
+        max_bytes.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self.size = sum(size for _, size, _ in entries)
+        low_water = self.max_bytes * EVICT_TO
+        for path, size, _ in entries:
+            if self.size <= low_water:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+    def pipe(self, nlp, text_contexts, batch_size, disable=()):
+        """
+        Drop-in for nlp.pipe(text_contexts, as_tuples=True, ...) that loads cached
+        Docs and only parses the texts not in the cache. Yields (doc, context) in
+        input order.
+        """
+        signature = model_signature(nlp, disable)
+        batch = []
+        for text, context in text_contexts:
+            batch.append((text, context))
+            if len(batch) >= batch_size:
+                yield from self._pipe_batch(nlp, batch, batch_size, disable, signature)
+                batch = []
+        if batch:
+            yield from self._pipe_batch(nlp, batch, batch_size, disable, signature)
+
+    def _pipe_batch(self, nlp, batch, batch_size, disable, signature):
+        keys = [self.key(text, signature) for text, _ in batch]
+        docs = [self.get(key, nlp.vocab) for key in keys]
+
+        missing = [i for i, doc in enumerate(docs) if doc is None]
+        if missing:
+            parsed = nlp.pipe((batch[i][0] for i in missing), batch_size=batch_size, disable=disable)
+            for i, doc in zip(missing, parsed):
+                self.put(keys[i], doc)
+                docs[i] = doc
+
+        for doc, (_, context) in zip(docs, batch):
+            yield doc, context
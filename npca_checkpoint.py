@@ -0,0 +1,233 @@
+############# NPC Analyzer: checkpoints ##############
+# Manifest of the files already written to an output CSV, so that a long run that dies
+# part-way can be resumed instead of restarted.
+# The manifest is a JSON-lines file next to the CSV (<output>.checkpoint.jsonl). Its first
+# line records the CSV columns; every other line records one finished input file (path,
+# size, mtime) and the CSV length in bytes right after that file's row was written.
+# Rows and manifest lines are flushed as they are written, which is enough to survive the run
+# itself dying; they are fsync'ed (the CSV first) at most every SYNC_INTERVAL seconds and at
+# the end, against a crash of the whole machine. On resume the CSV is cut back to the last
+# recorded length, dropping any row the manifest missed, and manifest lines that point past
+# the end of the CSV (rows lost in a crash) are dropped as well.
+# For a corpus file (see npca_corpus) the first line also records the corpus file's size and
+# mtime and the options it is read with, and the other lines record finished texts by their
+# position in it.
+
+import json
+import os
+import time
+
+from npca_corpus import Record
+
+CHECKPOINT_SUFFIX = '.checkpoint.jsonl'
+# Seconds between fsyncs of the CSV and the manifest
+SYNC_INTERVAL = 1.0
+
+
+def checkpoint_path_for(output_file_path):
+    return output_file_path + CHECKPOINT_SUFFIX
+
+
+def file_signature(file_name):
+    stat = os.stat(file_name)
+    return {'path': os.path.abspath(file_name), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def _text_key(index):
+    # Texts of a corpus file are keyed by position; '#' cannot start an absolute path
+    return f'#{index}'
+
+
+def _is_text_key(key):
+    return key.startswith('#')
+
+
+def _record_key(record):
+    return record['path'] if 'path' in record else _text_key(record['text'])
+
+
+def _write_durably(file, data):
+    file.write(data)
+    file.flush()
+    os.fsync(file.fileno())
+
+
+class Checkpoint:
+    """
+    Checkpoint manifest of one output CSV.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.columns = None
+        self.completed = {}
+        self.header_length = None
+        self.csv_length = None
+        self.source = None
+        self.options = None
+        self._file = None
+        self._synced = 0.0
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        """
+        Read the manifest written by an earlier run. A torn last line (the run
+        died while writing it) is ignored.
+        """
+        self.completed = {}
+        with open(self.path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if 'columns' in record:
+                    self.columns = record['columns']
+                    self.source = record.get('source')
+                    self.options = record.get('options')
+                    self.header_length = self.csv_length = record['csv_length']
+                else:
+                    self.completed[_record_key(record)] = record
+                    self.csv_length = record['csv_length']
+        return self
+
+    def is_complete(self, file_name):
+        # A file counts as done only if it has not changed since it was recorded
+        if isinstance(file_name, Record):
+            return _text_key(file_name.index) in self.completed
+        record = self.completed.get(os.path.abspath(file_name))
+        if record is None:
+            return False
+        signature = file_signature(file_name)
+        return record['size'] == signature['size'] and record['mtime'] == signature['mtime']
+
+    def _header(self):
+        header = {'columns': self.columns, 'csv_length': self.header_length}
+        if self.source is not None:
+            header['source'] = self.source
+            header['options'] = self.options
+        return json.dumps(header)
+
+    def start(self, columns, csv_length, source=None, options=None):
+        """
+        Begin a new manifest, replacing any previous one. source is the
+        corpus file the texts come from, if any, and options the options it is
+        read with (see npca_corpus.corpus_options).
+        """
+        self.columns = columns
+        self.source = file_signature(source) if source else None
+        self.options = options
+        self.completed = {}
+        self.header_length = self.csv_length = csv_length
+        self._file = open(self.path, 'w', encoding='utf-8')
+        _write_durably(self._file, self._header() + '\n')
+
+    def reopen(self):
+        """
+        Continue appending to a loaded manifest. It is rewritten first (atomically)
+        so that a torn last line does not end up in the middle of the file.
+        """
+        lines = [self._header()]
+        lines.extend(json.dumps(record) for record in self.completed.values())
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            _write_durably(file, '\n'.join(lines) + '\n')
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def resume(self, output_file_path, columns, source=None, options=None):
+        """
+        Prepare output_file_path for appending the rows of the files not done yet.
+
+        Drops CSV rows the manifest does not cover, and the rows of recorded files
+        that have since changed or disappeared (they will be analyzed again).
+        Raises ValueError if the earlier run wrote different columns, or read
+        another corpus file, one that has changed since, or the same one with
+        other options (the positions of its texts would not match).
+        """
+        self.load()
+        if self.columns != columns:
+            raise ValueError(f'Cannot resume "{output_file_path}": it was started with columns '
+                             f'{self.columns}, not {columns}.')
+        if self.source != (file_signature(source) if source else None):
+            raise ValueError(f'Cannot resume "{output_file_path}": its corpus file is not the one it was '
+                             'started with, or has changed since.')
+        if self.options != options:
+            raise ValueError(f'Cannot resume "{output_file_path}": it was started reading the corpus with '
+                             f'{self.options}, not {options}.')
+
+        csv_size = os.path.getsize(output_file_path)
+        if csv_size < self.header_length:
+            raise ValueError(f'Cannot resume "{output_file_path}": it is shorter than its header; start it over.')
+        if csv_size < self.csv_length:
+            # Manifest lines reached the disk before the rows they record; those files are redone
+            self.completed = {key: record for key, record in self.completed.items()
+                              if record['csv_length'] <= csv_size}
+            self.csv_length = max([self.header_length] + [record['csv_length']
+                                                          for record in self.completed.values()])
+        with open(output_file_path, 'r+b') as out_file:
+            out_file.truncate(self.csv_length)
+
+        stale = [path for path in self.completed
+                 if not _is_text_key(path) and (not os.path.exists(path) or not self.is_complete(path))]
+        if stale:
+            self._drop_rows(output_file_path, set(stale))
+        self.reopen()
+
+    def _drop_rows(self, output_file_path, stale):
+        # Rebuild the CSV from the byte range of every row that is still valid
+        with open(output_file_path, 'rb') as file:
+            data = file.read()
+        parts = [data[:self.header_length]]
+        completed = {}
+        start = length = self.header_length
+        for path, record in self.completed.items():
+            end = record['csv_length']
+            if path not in stale:
+                parts.append(data[start:end])
+                length += end - start
+                completed[path] = dict(record, csv_length=length)
+            start = end
+
+        tmp_path = output_file_path + '.tmp'
+        with open(tmp_path, 'wb') as file:
+            _write_durably(file, b''.join(parts))
+        os.replace(tmp_path, output_file_path)
+        self.completed = completed
+        self.csv_length = length
+
+    def record(self, file_name, out_file):
+        """
+        Record file_name as done, its row having just been written to out_file,
+        the CSV.
+        """
+        out_file.flush()
+        if isinstance(file_name, Record):
+            record = {'text': file_name.index, 'id': file_name.id}
+        else:
+            record = file_signature(file_name)
+        record['csv_length'] = out_file.tell()
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        self.completed[_record_key(record)] = record
+        self.csv_length = record['csv_length']
+        if time.monotonic() - self._synced >= SYNC_INTERVAL:
+            self.sync(out_file)
+
+    def sync(self, out_file):
+        """
+        fsync the CSV, then the manifest, so that the manifest on disk never
+        records more rows than the CSV on disk holds (resume relies on it).
+        """
+        out_file.flush()
+        os.fsync(out_file.fileno())
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+        self._synced = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
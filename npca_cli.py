@@ -0,0 +1,214 @@
+############# NPC Analyzer: command line ##############
+# Headless entry point for batch nodes. Produces the same CSV as the GUI.
+# e.g.,
+#   python npca_cli.py corpus/ -o results.csv
+#   python npca_cli.py corpus/ -o stage2.csv --stage 2 --normed
+#   python npca_cli.py corpus/ -o results.csv --features of prep ml --raw
+#   python npca_cli.py corpus/ -o results.csv -j 32 --batch-size 64
+#   python npca_cli.py corpus/ -o results.csv --cache
+#   python npca_cli.py corpus/ -o results.csv --resume
+#   python npca_cli.py corpus/ -o results.csv --rules npca_rules.json
+#   python npca_cli.py corpus/ -o results.csv --sentence-memo
+#   python npca_cli.py /mnt/nfs/corpus -o results.csv --read-ahead 64 --read-threads 8 --write-behind
+#   python npca_cli.py corpus/ -o part3.csv --manifest corpus.manifest.json --shard 3
+#   python npca_cli.py essays.jsonl.gz -o results.csv --id-field essay_id --meta grade prompt
+#   python npca_cli.py corpus.tar.gz -o results.csv --member-ext .txt --max-member-size 5000000
+#   python npca_cli.py corpus/ -o results.csv --export-matches matches.jsonl.gz
+#   python npca_cli.py corpus/ -o results.csv --db results.db --db-matches
+
+import argparse
+import os
+import sqlite3
+import sys
+
+from npca_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_SIZE, model_signature
+from npca_checkpoint import checkpoint_path_for
+from npca_corpus import DEFAULT_ID_FIELD, DEFAULT_TEXT_FIELD, archive_format, is_corpus_file
+from npca_engine import (DEFAULT_BATCH_SIZE, DEFAULT_READ_AHEAD, DEFAULT_WRITE_BEHIND, MODEL_NAME, STAGES,
+                         WorkerPool, features_for_columns, features_for_stages, load_model, plan_components,
+                         run_corpus, select_columns)
+from npca_features import FEATURES
+from npca_memo import DEFAULT_MEMO_SIZE
+from npca_profile import RunProfile
+from npca_shard import load_manifest, shard_files, write_shard_meta
+
+
+def add_column_arguments(parser):
+    parser.add_argument('--stage', type=int, action='append', choices=sorted(STAGES),
+                        help='developmental stage to include (repeatable, default: all stages)')
+    parser.add_argument('--features', nargs='+', choices=FEATURES,
+                        help='individual structures to include, in addition to --stage')
+    parser.add_argument('--raw', action='store_true', help='write raw frequencies')
+    parser.add_argument('--normed', action='store_true', help='write frequencies per 1,000 words')
+
+
+def columns_from_args(args):
+    features = []
+    if args.stage:
+        features.extend(features_for_stages(args.stage))
+    if args.features:
+        features.extend(args.features)
+    if not features:
+        features = list(FEATURES)
+
+    # Like the GUI, report both frequencies unless one of them is asked for explicitly
+    freq_raw, freq_normed = args.raw, args.normed
+    if not freq_raw and not freq_normed:
+        freq_raw = freq_normed = True
+
+    return select_columns(features, freq_raw, freq_normed)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Count the noun phrase complexity structures of Biber et al. (2011) in a folder of text files '
+                    'or a corpus file.')
+    parser.add_argument('input_folder',
+                        help='folder containing the text files to analyze, a JSONL, TSV or CSV corpus file '
+                             '(optionally .gz) with one text per record, or a zip or tar archive of text files')
+    parser.add_argument('-o', '--output', required=True, help='path of the CSV file to write')
+    add_column_arguments(parser)
+    parser.add_argument('--model', default=MODEL_NAME, help=f'spaCy pipeline to load (default: {MODEL_NAME})')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'texts passed to nlp.pipe at a time (default: {DEFAULT_BATCH_SIZE})')
+    parser.add_argument('-j', '--n-process', type=int, default=1,
+                        help='worker processes used for parsing and extraction (default: 1)')
+    parser.add_argument('--cache', action='store_true',
+                        help=f'reuse parses from the parse cache (default location: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--cache-dir', help='parse cache folder (implies --cache)')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE // (1024 * 1024),
+                        help='maximum parse cache size in MB (default: %(default)s)')
+    parser.add_argument('--chunk-size', type=int,
+                        help='parse files larger than this many characters in chunks, 0 to disable '
+                             '(default: the model\'s max_length, 1,000,000 for spaCy pipelines)')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted run, appending only the files missing from the output')
+    parser.add_argument('--no-checkpoint', action='store_true',
+                        help='do not record finished files in <output>.checkpoint.jsonl (disables --resume)')
+    parser.add_argument('--profile', action='store_true',
+                        help='record per-file timings and peak memory in <output>.profile.json/.csv')
+    parser.add_argument('--rules', metavar='CONFIG',
+                        help='count the structures with the DependencyMatcher rules of this JSON file '
+                             '(e.g. npca_rules.json) instead of the built-in extractors')
+    parser.add_argument('--sentence-memo', type=int, nargs='?', const=DEFAULT_MEMO_SIZE, default=None, metavar='N',
+                        help='count sentence by sentence and reuse the counts of repeated sentences, keeping up '
+                             f'to N of them (default N: {DEFAULT_MEMO_SIZE}); counts can differ slightly from '
+                             'whole-text parsing, see npca_memo')
+    parser.add_argument('--read-ahead', type=int, nargs='?', const=DEFAULT_READ_AHEAD, default=0, metavar='N',
+                        help='read and decode up to N files ahead of the parser in background threads '
+                             f'(default N: {DEFAULT_READ_AHEAD}); helps on network-mounted corpora')
+    parser.add_argument('--read-threads', type=int, default=4,
+                        help='threads reading files with --read-ahead (default: %(default)s)')
+    parser.add_argument('--write-behind', type=int, nargs='?', const=DEFAULT_WRITE_BEHIND, default=0, metavar='N',
+                        help='write rows from a background thread, queueing up to N of them '
+                             f'(default N: {DEFAULT_WRITE_BEHIND})')
+    parser.add_argument('--text-field', default=DEFAULT_TEXT_FIELD,
+                        help='with a corpus file, the field holding the text (default: %(default)s)')
+    parser.add_argument('--id-field', default=DEFAULT_ID_FIELD,
+                        help='with a corpus file, the field written to the "file" column; records without it '
+                             'get their position (default: %(default)s)')
+    parser.add_argument('--meta', nargs='+', default=[], metavar='FIELD',
+                        help='with a corpus file, fields copied into output columns after the id')
+    parser.add_argument('--member-ext', nargs='+', metavar='EXT',
+                        help='with an archive, only read members ending in one of these extensions (e.g. .txt)')
+    parser.add_argument('--max-member-size', type=int, metavar='BYTES',
+                        help='with an archive, skip members larger than this')
+    parser.add_argument('--export-matches', metavar='PATH',
+                        help='also write every matched phrase with its sentence, character offsets and head lemma '
+                             'to PATH (.jsonl, .jsonl.gz or .parquet), streamed as files finish')
+    parser.add_argument('--db', metavar='PATH',
+                        help='also store the run and its rows in the SQLite database PATH, created if needed '
+                             '(see npca_sqlite.py for queries)')
+    parser.add_argument('--db-matches', action='store_true',
+                        help='with --db, store every matched phrase too, for queries by head lemma')
+    parser.add_argument('--manifest', help='manifest of a sharded run (see npca_shard.py); the columns come from it')
+    parser.add_argument('--shard', type=int, help='with --manifest, the shard to analyze')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not report progress')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    from_file = is_corpus_file(args.input_folder)
+    if not os.path.isdir(args.input_folder) and not from_file:
+        print(f'Error: input folder, corpus file or archive "{args.input_folder}" not found.', file=sys.stderr)
+        return 2
+    if args.meta and not (from_file and archive_format(args.input_folder) is None):
+        print('Error: --meta needs a corpus file as input.', file=sys.stderr)
+        return 2
+    if (args.member_ext or args.max_member_size is not None) and archive_format(args.input_folder) is None:
+        print('Error: --member-ext and --max-member-size apply to archives only.', file=sys.stderr)
+        return 2
+
+    if (args.manifest is None) != (args.shard is None):
+        print('Error: --manifest and --shard go together.', file=sys.stderr)
+        return 2
+    manifest = file_list = None
+    if args.manifest is not None:
+        if from_file:
+            print('Error: sharded runs read a folder of text files, not a corpus file or archive.', file=sys.stderr)
+            return 2
+        if args.stage or args.features or args.raw or args.normed:
+            print('Error: the columns of a sharded run come from its manifest; drop --stage, --features, '
+                  '--raw and --normed.', file=sys.stderr)
+            return 2
+        try:
+            manifest = load_manifest(args.manifest)
+            file_list = shard_files(manifest, args.shard, args.input_folder)
+        except (OSError, ValueError) as e:
+            print(f'Error: {e}', file=sys.stderr)
+            return 2
+        selected_columns = manifest['columns']
+    else:
+        selected_columns = columns_from_args(args)
+
+    unit = 'texts' if from_file else 'files'
+
+    def report(done, total):
+        print(f'\r{done}/{total} {unit}', end='', file=sys.stderr, flush=True)
+
+    if args.resume and args.no_checkpoint:
+        print('Error: --resume needs the checkpoint manifest; drop --no-checkpoint.', file=sys.stderr)
+        return 2
+    checkpoint_path = None if args.no_checkpoint else checkpoint_path_for(args.output)
+
+    profile = RunProfile() if args.profile else None
+    cache_dir = args.cache_dir or (DEFAULT_CACHE_DIR if args.cache else None)
+
+    # Worker processes are forked from this one once it has loaded the model where the
+    # platform allows it (see WorkerPool), so the model is loaded once per node
+    pool = WorkerPool(args.n_process, args.model) if args.n_process > 1 else None
+    nlp = load_model(args.model) if args.n_process == 1 or manifest is not None else None
+    try:
+        total = run_corpus(args.input_folder, args.output, selected_columns, nlp=nlp,
+                           progress_callback=None if args.quiet else report,
+                           model_name=args.model, batch_size=args.batch_size, n_process=args.n_process,
+                           cache_dir=cache_dir, cache_size=args.cache_size * 1024 * 1024,
+                           chunk_size=args.chunk_size, checkpoint_path=checkpoint_path,
+                           resume=args.resume, profile=profile, rules_path=args.rules,
+                           sentence_memo=args.sentence_memo, file_list=file_list, read_ahead=args.read_ahead,
+                           read_threads=args.read_threads, write_behind=args.write_behind,
+                           text_field=args.text_field, id_field=args.id_field, meta_fields=args.meta,
+                           member_extensions=args.member_ext, max_member_size=args.max_member_size, pool=pool,
+                           match_export=args.export_matches, results_db=args.db, db_matches=args.db_matches)
+    except (ValueError, OSError, sqlite3.Error) as e:
+        # Bad input or options, and files that cannot be read or written (including the --db database)
+        print(f'\nError: {e}', file=sys.stderr)
+        return 1
+    finally:
+        if pool is not None:
+            pool.close()
+    if manifest is not None:
+        _, disabled = plan_components(nlp.pipe_names, features_for_columns(selected_columns),
+                                      bool(args.export_matches) or args.db_matches)
+        write_shard_meta(args.output, manifest, args.shard, model_signature(nlp, disabled))
+    if not args.quiet:
+        print(f'\nCSV file "{args.output}" generated from {total} {unit}.', file=sys.stderr)
+        if profile is not None:
+            print(profile.summary(), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
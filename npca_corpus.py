@@ -0,0 +1,259 @@
+############# NPC Analyzer: corpus files ##############
+# Streaming readers for corpora shipped as one big file instead of a folder of texts:
+#   JSONL (.jsonl, .ndjson)  one JSON object per line
+#   TSV   (.tsv)             tab-separated, header row, no quoting
+#   CSV   (.csv)             comma-separated, header row, quoted fields may span lines
+# each optionally gzip-compressed (.gz). Every record has a text field, an id field and any
+# number of metadata fields, which are carried through into the output rows.
+# Uncompressed files are scanned line by line through a read-only memory map, so only the
+# record being read is held in memory; gzip files are decompressed as a stream.
+# Archives (.zip, .tar, .tar.gz/.tgz, .tar.bz2, .tar.xz) are read the same way, one member at
+# a time and without extracting anything to disk: every regular member is one text, its path
+# inside the archive is its id, and members can be filtered by extension and size.
+
+import csv
+import gzip
+import json
+import mmap
+import os
+import tarfile
+import zipfile
+from collections import namedtuple
+
+CORPUS_FORMATS = {
+    '.jsonl': 'jsonl',
+    '.ndjson': 'jsonl',
+    '.tsv': 'tsv',
+    '.csv': 'csv',
+}
+
+ARCHIVE_FORMATS = {
+    '.zip': 'zip',
+    '.tar': 'tar',
+    '.tar.gz': 'tar',
+    '.tgz': 'tar',
+    '.tar.bz2': 'tar',
+    '.tar.xz': 'tar',
+}
+
+DEFAULT_TEXT_FIELD = 'text'
+DEFAULT_ID_FIELD = 'id'
+
+# One text of a corpus file. index is its position in the file, id its id field
+# (or the index when there is none), meta the values of the metadata fields.
+Record = namedtuple('Record', ['index', 'id', 'text', 'meta'])
+
+_BLOCK_SIZE = 1024 * 1024
+# Longest TSV/CSV field accepted (the csv module's own default is 128 KB, less than a long text);
+# the largest value its field_size_limit() takes on every platform
+MAX_FIELD_SIZE = 2 ** 31 - 1
+
+
+def corpus_format(path):
+    """
+    'jsonl', 'tsv' or 'csv' for a corpus file name, None for anything else.
+    """
+    name = path.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    for suffix, fmt in CORPUS_FORMATS.items():
+        if name.endswith(suffix):
+            return fmt
+    return None
+
+
+def archive_format(path):
+    """
+    'zip' or 'tar' for an archive file name, None for anything else.
+    """
+    name = path.lower()
+    for suffix, fmt in ARCHIVE_FORMATS.items():
+        if name.endswith(suffix):
+            return fmt
+    return None
+
+
+def is_corpus_file(path):
+    return os.path.isfile(path) and (corpus_format(path) is not None or archive_format(path) is not None)
+
+
+def iter_lines(path):
+    """
+    Lines of a text file, line endings included, decoded as UTF-8.
+    """
+    if path.lower().endswith('.gz'):
+        with gzip.open(path, 'rt', encoding='utf-8', errors='ignore', newline='') as file:
+            yield from file
+        return
+
+    with open(path, 'rb') as file:
+        if file.seek(0, 2) == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            size = len(data)
+            while start < size:
+                end = data.find(b'\n', start)
+                end = size if end < 0 else end + 1
+                yield data[start:end].decode('utf-8', errors='ignore')
+                start = end
+
+
+def _iter_blocks(path):
+    opener = gzip.open if path.lower().endswith('.gz') else open
+    with opener(path, 'rb') as file:
+        yield from iter(lambda: file.read(_BLOCK_SIZE), b'')
+
+
+def count_records(path):
+    """
+    Number of records in a corpus file, for progress reporting. Counts lines, so
+    it overestimates CSV files whose quoted fields contain line breaks.
+    """
+    lines = 0
+    last = b'\n'
+    for block in _iter_blocks(path):
+        lines += block.count(b'\n')
+        last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    if corpus_format(path) != 'jsonl':
+        lines -= 1  # header row
+    return max(lines, 0)
+
+
+def _field(values, name, path, number):
+    if name not in values:
+        raise ValueError(f'{path}, record {number}: no "{name}" field.')
+    return values[name]
+
+
+def iter_records(path, text_field=DEFAULT_TEXT_FIELD, id_field=DEFAULT_ID_FIELD, meta_fields=()):
+    """
+    Yield a Record for every text of a corpus file, in file order.
+    Raises ValueError for a record without the text field (or a missing
+    metadata field), or a line that is not valid JSON in a JSONL file.
+    """
+    fmt = corpus_format(path)
+    if fmt is None:
+        raise ValueError(f'"{path}" is not a JSONL, TSV or CSV corpus file.')
+
+    if fmt == 'jsonl':
+        def rows():
+            for number, line in enumerate(iter_lines(path), 1):
+                if not line.strip():
+                    continue
+                try:
+                    values = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f'{path}, line {number}: {e}') from None
+                if not isinstance(values, dict):
+                    raise ValueError(f'{path}, line {number}: expected a JSON object.')
+                yield values
+    else:
+        def rows():
+            if csv.field_size_limit() < MAX_FIELD_SIZE:
+                csv.field_size_limit(MAX_FIELD_SIZE)
+            if fmt == 'tsv':
+                reader = csv.reader(iter_lines(path), delimiter='\t', quoting=csv.QUOTE_NONE)
+            else:
+                reader = csv.reader(iter_lines(path))
+            try:
+                header = next(reader, None)
+                for row in reader:
+                    if row:
+                        yield dict(zip(header, row))
+            except csv.Error as e:
+                raise ValueError(f'{path}, line {reader.line_num}: {e}') from None
+
+    for index, values in enumerate(rows()):
+        text = _field(values, text_field, path, index + 1)
+        record_id = values.get(id_field, index)
+        meta = tuple(_field(values, name, path, index + 1) for name in meta_fields)
+        yield Record(index, str(record_id), text if isinstance(text, str) else str(text), meta)
+
+
+def _extensions(extensions):
+    return sorted({'.' + ext.lower().lstrip('.') for ext in extensions}) if extensions else None
+
+
+def _wanted(name, size, extensions, max_size):
+    # Hidden files are skipped, as in a folder (and so are macOS resource forks in zips)
+    parts = name.split('/')
+    if any(part.startswith('.') and part != '.' or part == '__MACOSX' for part in parts):
+        return False
+    if extensions and not name.lower().endswith(tuple(_extensions(extensions))):
+        return False
+    return max_size is None or size <= max_size
+
+
+def _decode(data):
+    # Same text as read_text() gives for a file on disk: undecodable bytes dropped,
+    # line endings translated
+    return data.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+
+
+def _archive_members(path, extensions, max_size):
+    # (member path, open member) of every wanted member, in archive order
+    if archive_format(path) == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _wanted(info.filename, info.file_size, extensions, max_size):
+                    with archive.open(info) as member:
+                        yield info.filename, member
+    else:
+        # Stream mode reads the (compressed) archive front to back, never seeking
+        with tarfile.open(path, 'r|*') as archive:
+            for info in archive:
+                if info.isfile() and _wanted(info.name, info.size, extensions, max_size):
+                    yield info.name, archive.extractfile(info)
+
+
+def iter_archive_records(path, extensions=None, max_size=None):
+    """
+    Yield a Record for every regular member of an archive, in archive order,
+    keyed by its path inside the archive. With extensions (e.g. ['.txt']) only
+    members ending in one of them are read; members larger than max_size bytes
+    are skipped.
+    """
+    for index, (name, member) in enumerate(_archive_members(path, extensions, max_size)):
+        yield Record(index, name, _decode(member.read()), ())
+
+
+def iter_corpus(path, text_field=DEFAULT_TEXT_FIELD, id_field=DEFAULT_ID_FIELD, meta_fields=(), extensions=None,
+                max_size=None):
+    """
+    Records of a corpus file or an archive. Raises ValueError when metadata
+    fields are asked of an archive, whose members have none.
+    """
+    if archive_format(path) is None:
+        return iter_records(path, text_field, id_field, meta_fields)
+    if meta_fields:
+        raise ValueError(f'"{path}" is an archive; its members have no metadata fields.')
+    return iter_archive_records(path, extensions, max_size)
+
+
+def corpus_options(path, text_field=DEFAULT_TEXT_FIELD, id_field=DEFAULT_ID_FIELD, extensions=None,
+                   max_size=None):
+    """
+    The options that decide which texts of a corpus file or an archive are read,
+    and what their positions and ids are (metadata fields only add columns).
+    """
+    if archive_format(path) is None:
+        return {'text_field': text_field, 'id_field': id_field}
+    return {'extensions': _extensions(extensions), 'max_size': max_size}
+
+
+def count_corpus(path, extensions=None, max_size=None):
+    """
+    Number of texts in a corpus file or an archive, for progress reporting.
+    A compressed tar archive is decompressed once to count its members.
+    """
+    if archive_format(path) is None:
+        return count_records(path)
+    if archive_format(path) == 'zip':
+        with zipfile.ZipFile(path) as archive:
+            return sum(1 for info in archive.infolist()
+                       if not info.is_dir() and _wanted(info.filename, info.file_size, extensions, max_size))
+    with tarfile.open(path, 'r|*') as archive:
+        return sum(1 for info in archive if info.isfile() and _wanted(info.name, info.size, extensions, max_size))
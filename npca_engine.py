@@ -0,0 +1,734 @@
+############# NPC Analyzer: batch engine ##############
+# GUI-free corpus engine shared by the Qt window (noun_phrase_complexity_analyzer_v2.py)
+# and the command line entry point (npca_cli.py).
+# It loads the spaCy model, runs the count_* extractors on every text file of an input
+# folder and writes one CSV row per file with the selected raw and normed frequencies.
+# The input can also be a single JSONL/TSV/CSV corpus file (see npca_corpus), with one
+# row per text, keyed by its id and followed by the chosen metadata columns, or a zip or
+# tar archive, with one row per member, keyed by its path inside the archive.
+
+import gc
+import glob
+import io
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import spacy
+
+from npca_cache import DEFAULT_CACHE_SIZE, ParseCache
+from npca_checkpoint import Checkpoint
+from npca_corpus import DEFAULT_ID_FIELD, DEFAULT_TEXT_FIELD, Record, corpus_options, count_corpus, iter_corpus
+from npca_export import MatchExporter
+from npca_features import FEATURES, normed
+from npca_matches import match_records, sentence_starts
+from npca_memo import SentenceMemo
+from npca_profile import new_timings, peak_rss_mb
+from npca_rules import RuleSet
+from npca_sqlite import ResultStore
+from npca_stream import iter_file_chunks, iter_text_chunks
+from npca_vector import SHARED, count_all_vectorized
+
+MODEL_NAME = 'en_core_web_sm'
+
+# Number of texts handed to nlp.pipe at a time (and per worker task when n_process > 1)
+DEFAULT_BATCH_SIZE = 16
+
+# Files read ahead of the parser in the pipelined mode, and rows queued for the writer thread
+DEFAULT_READ_AHEAD = 32
+DEFAULT_WRITE_BEHIND = 256
+
+# Feature prefixes grouped by the developmental stages of Biber et al. (2011)
+STAGES = {
+    2: ['adj'],
+    3: ['rc', 'nm', 'poss', 'of', 'prep'],
+    4: ['nonf', 'adj_nm'],
+    5: ['comp', 'ml'],
+}
+
+# spaCy components the extractors read from. Every structure is defined on coarse POS
+# (tagger + attribute_ruler in en_core_web_sm, or a morphologizer), fine-grained tags
+# and dependency arcs (parser); the shared embedding layers feed those components.
+# Nothing reads entities, so NER is never needed; the lemmatizer only runs for the match
+# export, which reports the lemma of every head noun.
+_SYNTAX_COMPONENTS = {'tok2vec', 'transformer', 'tagger', 'morphologizer', 'attribute_ruler', 'parser'}
+FEATURE_COMPONENTS = {feature: _SYNTAX_COMPONENTS for feature in FEATURES}
+EXPORT_COMPONENTS = {'lemmatizer'}
+
+_models = {}
+
+
+def load_model(model_name=MODEL_NAME):
+    """
+    Load a spaCy pipeline once per process and reuse it on later calls.
+    """
+    if model_name not in _models:
+        _models[model_name] = spacy.load(model_name)
+    return _models[model_name]
+
+
+def get_all_columns():
+    columns = []
+    for feature in FEATURES:
+        columns.append(f'{feature}_raw')
+        columns.append(f'{feature}_normed')
+    return columns
+
+
+def select_columns(features, freq_raw=True, freq_normed=True):
+    """
+    Build the sorted list of output columns for the given feature prefixes,
+    the same way the GUI does from its stage and frequency checkboxes.
+    """
+    selected_columns = []
+    for prefix in features:
+        if freq_raw:
+            selected_columns.append(f'{prefix}_raw')
+        if freq_normed:
+            selected_columns.append(f'{prefix}_normed')
+    return sorted(set(selected_columns))
+
+
+def features_for_stages(stages):
+    features = []
+    for stage in stages:
+        features.extend(STAGES[stage])
+    return features
+
+
+def features_for_columns(selected_columns):
+    """
+    Feature prefixes whose raw or normed column is selected, in FEATURES order.
+    """
+    selected = set(selected_columns)
+    return [feature for feature in FEATURES
+            if f'{feature}_raw' in selected or f'{feature}_normed' in selected]
+
+
+def plan_components(pipe_names, features, export_matches=False):
+    """
+    Split a pipeline's components into (needed, disabled) for the given features
+    (and for the match export).
+    """
+    required = set(EXPORT_COMPONENTS) if export_matches else set()
+    for feature in features:
+        required |= FEATURE_COMPONENTS[feature]
+    needed = [name for name in pipe_names if name in required]
+    disabled = [name for name in pipe_names if name not in required]
+    return needed, disabled
+
+
+def list_input_files(input_folder):
+    return glob.glob(os.path.join(input_folder, '*'))
+
+
+def read_text(file_name):
+    with open(file_name, encoding='utf-8', errors='ignore') as file:
+        return file.read()
+
+
+def count_features(doc, features=FEATURES, counter=count_all_vectorized):
+    """
+    Raw count of each requested structure in a parsed Doc.
+    Only the counts are computed (by default on the Doc's attribute arrays, see
+    npca_vector); no phrase strings are built. counter(doc, features) may be
+    replaced, e.g. by RuleSet.count.
+    """
+    counts = counter(doc, features)
+    return {feature: counts[feature] for feature in features}
+
+
+def _count_features_timed(doc, features, extract_timings, counter=count_all_vectorized):
+    # Profiling variant of count_features: the vectorized counter times the setup its structures
+    # share and each structure's own step, in one pass. Other counters cannot split their work
+    # (a rule set runs all its patterns in one matcher pass), so their time is all shared time.
+    if counter is count_all_vectorized:
+        counts = count_all_vectorized(doc, features, timings=extract_timings)
+    else:
+        start = time.perf_counter()
+        counts = counter(doc, features)
+        extract_timings[SHARED] += time.perf_counter() - start
+    return {feature: counts[feature] for feature in features}
+
+
+def results_from_counts(counts, word_count):
+    """
+    Raw and normed frequency of each structure keyed by output column name.
+    """
+    results = {}
+    for feature, count in counts.items():
+        results[f'{feature}_raw'] = count
+        results[f'{feature}_normed'] = normed(count, word_count)
+    return results
+
+
+def compute_results(doc, word_count, features=FEATURES):
+    """
+    Count the structures in a parsed Doc and return the raw and normed
+    frequency of each requested structure keyed by output column name.
+    """
+    return results_from_counts(count_features(doc, features), word_count)
+
+
+def analyze_text(nlp, text, features=FEATURES):
+    """
+    Parse a text and return (word_count, results) for a single CSV row.
+    """
+    word_count = len(text.split())
+    _, disabled = plan_components(nlp.pipe_names, features)
+    doc = nlp(text, disable=disabled)
+    return word_count, compute_results(doc, word_count, features)
+
+
+def _csv_field(value):
+    # File names, ids and metadata may hold commas, quotes or line breaks
+    value = str(value)
+    if any(c in value for c in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def format_row(file_name, word_count, results, selected_columns):
+    # file_name is a path, or a Record of a corpus file whose id and metadata start the row
+    if isinstance(file_name, Record):
+        row = [_csv_field(file_name.id)] + [_csv_field(value) for value in file_name.meta] + [str(word_count)]
+    else:
+        row = [_csv_field(os.path.basename(file_name)), str(word_count)]
+    for col in selected_columns:
+        row.append(str(results.get(col, 0)))
+    return ','.join(row) + '\n'
+
+
+def format_header(selected_columns, meta_fields=()):
+    header = ['file'] + [_csv_field(field) for field in meta_fields] + ['Number of words'] + selected_columns
+    return ','.join(header) + '\n'
+
+
+def file_label(file_name):
+    # What the "file" column shows for an input
+    return file_name.id if isinstance(file_name, Record) else os.path.basename(file_name)
+
+
+def input_name(file_name):
+    # Name of an input in progress reports and profiles
+    return file_name.id if isinstance(file_name, Record) else file_name
+
+
+def _timed(iterable):
+    # Yields (item, seconds spent producing it)
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        yield item, time.perf_counter() - start
+
+
+def _is_large(file_name, chunk_size):
+    if not chunk_size:
+        return False
+    if isinstance(file_name, Record):
+        return len(file_name.text) > chunk_size
+    return os.path.getsize(file_name) > chunk_size
+
+
+def _file_contexts(file_list, chunk_size=None):
+    # (text, context) pairs for nlp.pipe(as_tuples=True); the context carries what the CSV row needs,
+    # the time spent reading the text and whether it was read ahead in another thread. Files larger
+    # than chunk_size are streamed as several texts, the last one flagged as such. Records of a
+    # corpus file are already in memory.
+    for file_name in file_list:
+        if isinstance(file_name, Record):
+            if _is_large(file_name, chunk_size):
+                chunks = [(chunk, 0.0) for chunk in iter_text_chunks(io.StringIO(file_name.text), chunk_size)]
+            else:
+                chunks = [(file_name.text, 0.0)]
+        elif _is_large(file_name, chunk_size):
+            chunks = _timed(iter_file_chunks(file_name, chunk_size))
+        else:
+            start = time.perf_counter()
+            text = read_text(file_name)
+            chunks = [(text, time.perf_counter() - start)]
+
+        previous = None
+        for chunk in chunks:
+            if previous is not None:
+                text, read_seconds = previous
+                yield text, (file_name, len(text.split()), False, read_seconds, False)
+            previous = chunk
+        text, read_seconds = previous
+        yield text, (file_name, len(text.split()), True, read_seconds, False)
+
+
+def _prefetched_contexts(file_list, chunk_size=None, read_ahead=DEFAULT_READ_AHEAD, read_threads=1):
+    # Same pairs as _file_contexts, but files are read and decoded by read_threads threads up to
+    # read_ahead files ahead of the parser, so that I/O latency hides behind parsing. Files
+    # streamed in chunks are still read in place, chunk by chunk, to keep their memory bounded.
+    def read(file_name):
+        if isinstance(file_name, Record) or _is_large(file_name, chunk_size):
+            return None
+        start = time.perf_counter()
+        text = read_text(file_name)
+        return text, len(text.split()), time.perf_counter() - start
+
+    pool = ThreadPoolExecutor(read_threads, thread_name_prefix='npca-reader')
+    try:
+        files = iter(file_list)
+        pending = deque((file_name, pool.submit(read, file_name)) for file_name in islice(files, read_ahead))
+        while pending:
+            file_name, future = pending.popleft()
+            for next_file in islice(files, 1):
+                pending.append((next_file, pool.submit(read, next_file)))
+            result = future.result()
+            if result is None:
+                yield from _file_contexts([file_name], chunk_size)
+            else:
+                text, word_count, read_seconds = result
+                yield text, (file_name, word_count, True, read_seconds, True)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _iter_rows(nlp, file_list, batch_size=DEFAULT_BATCH_SIZE, features=FEATURES, cache=None, chunk_size=None,
+               profile=False, rules_path=None, sentence_memo=None, read_ahead=0, read_threads=1,
+               export_matches=False, memo=None, rules=None):
+    if profile:
+        # One text per batch, so that parse time can be attributed to the file being parsed
+        batch_size = 1
+    _, disabled = plan_components(nlp.pipe_names, features, export_matches)
+    if chunk_size is None:
+        # Only texts the model could not parse whole are chunked
+        chunk_size = nlp.max_length
+    if rules_path and rules is None:
+        rules = RuleSet.from_file(nlp.vocab, rules_path)
+    counter = rules.count if rules_path else count_all_vectorized
+
+    def parse(text_contexts):
+        if cache is None:
+            return nlp.pipe(text_contexts, as_tuples=True, batch_size=batch_size, disable=disabled)
+        return cache.pipe(nlp, text_contexts, batch_size, disable=disabled)
+
+    if read_ahead:
+        text_contexts = _prefetched_contexts(file_list, chunk_size, read_ahead, read_threads)
+    else:
+        text_contexts = _file_contexts(file_list, chunk_size)
+    if sentence_memo:
+        # Texts come out already counted, sentence by sentence (see npca_memo)
+        if memo is None:
+            memo = SentenceMemo(sentence_memo)
+        parsed = memo.pipe(text_contexts, parse, lambda doc: count_features(doc, features, counter), features)
+    else:
+        parsed = parse(text_contexts)
+
+    # Sum the counts of a file's chunks; each chunk Doc is dropped as soon as it is counted
+    # (and its matches turned into export records, with offsets counted over the whole file)
+    counts = None
+    word_count = 0
+    timings = new_timings() if profile else None
+    matches = [] if export_matches else None
+    char_offset = sentence_offset = 0
+    for (item, (file_name, chunk_words, last, read_seconds, prefetched)), seconds in _timed(parsed):
+        if profile:
+            # The text is read while the pipe pulls it, so reading is part of the wait for the Doc
+            # (unless it was read ahead in another thread; files streamed in chunks never are)
+            timings['read'] += read_seconds
+            timings['parse'] += seconds if prefetched else seconds - read_seconds
+        if sentence_memo:
+            # With the memo, item is already the counts; extraction time is part of the parse time
+            chunk_counts = item
+        elif profile:
+            chunk_counts = _count_features_timed(item, features, timings['extract'], counter)
+        else:
+            chunk_counts = count_features(item, features, counter)
+        if export_matches:
+            starts = sentence_starts(item)
+            matches.extend(match_records(item, features, char_offset, sentence_offset, starts))
+            char_offset += len(item.text)
+            sentence_offset += len(starts or ())
+        if counts is None:
+            counts = chunk_counts
+        else:
+            for feature, count in chunk_counts.items():
+                counts[feature] += count
+        word_count += chunk_words
+
+        if last:
+            yield file_name, word_count, results_from_counts(counts, word_count), timings, matches
+            counts = None
+            word_count = 0
+            timings = new_timings() if profile else None
+            matches = [] if export_matches else None
+            char_offset = sentence_offset = 0
+
+
+class _RowWriter:
+    # Writer thread behind a bounded queue of rows; an error in the thread is raised again
+    # in the producer by the next put() or by close()
+
+    _DONE = object()
+
+    def __init__(self, write_row, depth):
+        self._write_row = write_row
+        self._queue = queue.Queue(depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='npca-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            row = self._queue.get()
+            if row is self._DONE:
+                return
+            if self._error is None:
+                try:
+                    self._write_row(*row)
+                except BaseException as e:
+                    # Keep draining the queue so that the producer never blocks on a full one
+                    self._error = e
+
+    def put(self, row):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(row)
+
+    def close(self):
+        """
+        Write the remaining rows and stop the thread.
+        """
+        self._queue.put(self._DONE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+# Per-process state of the worker pool used when n_process > 1 or with a WorkerPool
+_worker = {}
+
+
+def _init_worker(model_name):
+    # A worker forked from a WorkerPool's process finds the model already loaded
+    _worker['nlp'] = load_model(model_name)
+    _worker['caches'] = {}
+    _worker['memos'] = {}
+    _worker['rules'] = {}
+
+
+def _analyze_chunk(task):
+    # Runs in a worker: read, parse and extract there, and send back only the count rows.
+    # The run's options come with every task, so that one pool can serve different runs.
+    cache_dir, cache_size, row_options, file_list = task
+    cache = None
+    if cache_dir:
+        if (cache_dir, cache_size) not in _worker['caches']:
+            _worker['caches'][cache_dir, cache_size] = ParseCache(cache_dir, cache_size)
+        cache = _worker['caches'][cache_dir, cache_size]
+    # The sentence memo outlives the task, so that sentences repeated across the corpus are
+    # parsed once per worker; its counts depend on the features and the extractors
+    memo = None
+    if row_options['sentence_memo']:
+        key = (row_options['sentence_memo'], tuple(row_options['features']), row_options['rules_path'])
+        if key not in _worker['memos']:
+            _worker['memos'][key] = SentenceMemo(row_options['sentence_memo'])
+        memo = _worker['memos'][key]
+    # Rules are compiled once per worker too, and again only if their config file changes
+    rules = None
+    if row_options['rules_path']:
+        key = (row_options['rules_path'], os.path.getmtime(row_options['rules_path']))
+        if key not in _worker['rules']:
+            _worker['rules'][key] = RuleSet.from_file(_worker['nlp'].vocab, row_options['rules_path'])
+        rules = _worker['rules'][key]
+    rows = list(_iter_rows(_worker['nlp'], file_list, cache=cache, memo=memo, rules=rules, **row_options))
+    if row_options['profile']:
+        # The parent cannot measure a live worker, so the worker reports its own peak
+        rss = peak_rss_mb()
+        for _, _, _, timings, _ in rows:
+            timings['worker_rss_mb'] = rss
+    return rows
+
+
+def _pooled_rows(pool, file_list, batch_size, window, cache_dir, cache_size, row_options):
+    # Chunks are handed out a few at a time rather than all at once, so that a streamed
+    # corpus file is never held in memory as a whole; rows come back in input order
+    files = iter(file_list)
+    chunks = iter(lambda: list(islice(files, batch_size)), [])
+    tasks = ((cache_dir, cache_size, row_options, chunk) for chunk in chunks)
+    pending = deque(pool.apply_async(_analyze_chunk, (task,)) for task in islice(tasks, window))
+    while pending:
+        rows = pending.popleft().get()
+        for task in islice(tasks, 1):
+            pending.append(pool.apply_async(_analyze_chunk, (task,)))
+        yield from rows
+
+
+class WorkerPool:
+    """
+    Worker processes kept alive across runs (pass it as pool= to analyze_files or
+    run_corpus), for a session that analyzes several corpora: the GUI, the
+    analysis service or a script.
+
+    On Linux the model is loaded once, in this process, and the workers are
+    forked from it: they start with the pipeline in memory and share its weights
+    copy-on-write. Elsewhere (no safe fork) every worker loads the model once
+    when it starts. Call close() when done, or use the pool as a context manager.
+    """
+
+    def __init__(self, n_process, model_name=MODEL_NAME):
+        self.n_process = n_process
+        self.model_name = model_name
+        if sys.platform.startswith('linux'):
+            context = multiprocessing.get_context('fork')
+            load_model(model_name)
+            # Move everything allocated so far, the model included, out of the cyclic garbage
+            # collector's reach while the workers are forked: its bookkeeping writes would copy
+            # those pages into every worker
+            gc.freeze()
+        else:
+            context = multiprocessing.get_context('spawn')
+        try:
+            self._pool = context.Pool(n_process, initializer=_init_worker, initargs=(model_name,))
+        finally:
+            # The workers keep their frozen copy; this process, which may live on (the GUI), collects
+            # its garbage as before
+            gc.unfreeze()
+
+    def rows(self, file_list, batch_size, cache_dir, cache_size, row_options):
+        return _pooled_rows(self._pool, file_list, batch_size, 2 * self.n_process, cache_dir, cache_size,
+                            row_options)
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _check_export(export_matches, rules_path, sentence_memo):
+    if export_matches and (rules_path or sentence_memo):
+        raise ValueError('The match export reports the matches of the built-in extractors on whole-text parses; '
+                         'it cannot be combined with rules or the sentence memo.')
+
+
+def analyze_files(file_list, nlp=None, model_name=MODEL_NAME, batch_size=DEFAULT_BATCH_SIZE, n_process=1,
+                  features=FEATURES, cache_dir=None, cache_size=DEFAULT_CACHE_SIZE, chunk_size=None,
+                  profile=False, rules_path=None, sentence_memo=None, read_ahead=0, read_threads=1, pool=None,
+                  export_matches=False):
+    """
+    Yield (file_name, word_count, results, timings, matches) for every file, in the order of file_list.
+    file_list may be any iterable of paths and corpus file Records (see npca_corpus).
+
+    Texts are streamed through nlp.pipe in batches of batch_size. With n_process > 1
+    the files are split into chunks of batch_size and handed to a pool of worker
+    processes that each load model_name; only the per-file count rows come back,
+    and they are yielded in input order.
+    Only the given features are extracted, and pipeline components that none of
+    them needs (see plan_components) are disabled while parsing.
+    With cache_dir, parsed Docs are loaded from and saved to a ParseCache there.
+    Files larger than chunk_size characters are read and parsed in chunks (see
+    npca_stream) and their counts summed into one row. chunk_size defaults to
+    the model's nlp.max_length, so that only texts spaCy would refuse are
+    chunked; 0 disables chunking.
+    timings is None unless profile is set, in which case it holds the seconds the
+    file spent being read, parsed and in each extractor (see npca_profile);
+    profiling parses one text at a time.
+    With rules_path, the structures are counted with the DependencyMatcher rules
+    of that config file (see npca_rules) instead of the built-in extractors.
+    With sentence_memo, texts are counted sentence by sentence and the counts of
+    up to sentence_memo distinct sentences are reused (see npca_memo for how this
+    can differ from whole-text parsing).
+    With read_ahead, up to read_ahead files are read and decoded by read_threads
+    threads while earlier files are parsed.
+    With pool, a WorkerPool, the files are analyzed by its workers (with its
+    model) instead, whatever n_process and model_name are. If the run stops
+    early, the few chunks already handed out still finish in the background.
+    matches is None unless export_matches is set, in which case it lists the
+    file's match records (see npca_matches.match_records and npca_export).
+    Raises ValueError if export_matches is combined with rules_path or
+    sentence_memo, which do not produce the matches it reports.
+    """
+    _check_export(export_matches, rules_path, sentence_memo)
+    row_options = {'batch_size': batch_size, 'features': list(features), 'chunk_size': chunk_size,
+                   'profile': profile, 'rules_path': rules_path, 'sentence_memo': sentence_memo,
+                   'read_ahead': read_ahead, 'read_threads': read_threads, 'export_matches': export_matches}
+    if pool is not None:
+        yield from pool.rows(file_list, batch_size, cache_dir, cache_size, row_options)
+        return
+    if n_process > 1:
+        with multiprocessing.Pool(n_process, initializer=_init_worker, initargs=(model_name,)) as mp_pool:
+            yield from _pooled_rows(mp_pool, file_list, batch_size, 2 * n_process, cache_dir, cache_size,
+                                    row_options)
+        return
+
+    if nlp is None:
+        nlp = load_model(model_name)
+    cache = ParseCache(cache_dir, cache_size) if cache_dir else None
+    yield from _iter_rows(nlp, file_list, cache=cache, **row_options)
+
+
+def run_corpus(input_folder, output_file_path, selected_columns, nlp=None, progress_callback=None,
+               model_name=MODEL_NAME, batch_size=DEFAULT_BATCH_SIZE, n_process=1,
+               cache_dir=None, cache_size=DEFAULT_CACHE_SIZE, chunk_size=None, should_stop=None,
+               checkpoint_path=None, resume=False, profile=None, rules_path=None, sentence_memo=None,
+               file_list=None, read_ahead=0, read_threads=1, write_behind=0, text_field=DEFAULT_TEXT_FIELD,
+               id_field=DEFAULT_ID_FIELD, meta_fields=(), member_extensions=None, max_member_size=None,
+               pool=None, match_export=None, results_db=None, db_matches=False):
+    """
+    Analyze every file in input_folder and write the CSV to output_file_path.
+
+    progress_callback, if given, is called as progress_callback(done, total)
+    after each file. batch_size, n_process, the parse cache settings,
+    chunk_size, rules_path, sentence_memo, read_ahead, read_threads and pool
+    are passed to analyze_files().
+    Only the structures behind selected_columns are computed.
+    should_stop, if given, is called before each row is written; when it returns
+    True the run stops and the CSV keeps the rows written so far.
+    With checkpoint_path, every row is flushed and recorded in a Checkpoint
+    manifest as soon as it is written; both reach the disk about every second
+    (see npca_checkpoint). With resume as well, an existing CSV and manifest
+    are continued: files already recorded are skipped and only the missing rows
+    are appended.
+    profile, if given, is a RunProfile that receives the timings of every file
+    and is saved next to the CSV when the run ends.
+    file_list, if given, is the list of files to analyze instead of every file
+    in input_folder (e.g. the files of one shard, see npca_shard).
+    With write_behind, rows are written (and checkpointed) by a writer thread
+    that holds up to write_behind rows, so that slow writes do not hold up
+    parsing; progress_callback is then called from that thread.
+    If input_folder is a JSONL, TSV or CSV corpus file, its texts are streamed
+    from it instead (see npca_corpus): text_field and id_field name the fields
+    holding the text and its id, and the meta_fields are written after the id.
+    If it is a zip or tar archive, its members are read one at a time without
+    extracting them; member_extensions and max_member_size select the members.
+    With match_export, a .jsonl, .jsonl.gz or .parquet path, every match is also
+    streamed there as its file's row is written (see npca_export); such a run
+    cannot be resumed.
+    With results_db, a SQLite path, the run and its rows are also stored there
+    (see npca_sqlite), with every match as well if db_matches is set; such a
+    run cannot be resumed either.
+    Returns the number of files in the CSV.
+    """
+    run_start = time.perf_counter()
+    features = features_for_columns(selected_columns)
+    corpus_file = input_folder if file_list is None and os.path.isfile(input_folder) else None
+    if corpus_file is not None:
+        # Streamed, never listed: the total is counted up front in a cheaper pass over the file,
+        # which is only worth its time when progress is reported
+        file_list = iter_corpus(corpus_file, text_field, id_field, meta_fields, member_extensions, max_member_size)
+        total_files = 0
+        if progress_callback is not None:
+            total_files = count_corpus(corpus_file, member_extensions, max_member_size)
+    else:
+        if meta_fields:
+            raise ValueError('Metadata columns need a corpus file as input, not a folder.')
+        if file_list is None:
+            file_list = list_input_files(input_folder)
+        total_files = len(file_list)
+    checkpoint_columns = list(meta_fields) + list(selected_columns)
+    options = None
+    if corpus_file is not None:
+        options = corpus_options(corpus_file, text_field, id_field, member_extensions, max_member_size)
+
+    checkpoint = Checkpoint(checkpoint_path) if checkpoint_path else None
+    resuming = resume and checkpoint is not None and checkpoint.exists() and os.path.exists(output_file_path)
+    if resuming and match_export:
+        raise ValueError('A run with a match export cannot be resumed; start it over.')
+    if resuming and results_db:
+        raise ValueError('A run writing to a results database cannot be resumed; start it over.')
+    if db_matches and not results_db:
+        raise ValueError('Storing the matches needs a results database.')
+    export_matches = bool(match_export) or db_matches
+    _check_export(export_matches, rules_path, sentence_memo)
+    exporter = MatchExporter(match_export) if match_export else None
+    store = ResultStore(results_db) if results_db else None
+    if store is not None:
+        model = model_name if nlp is None else f"{nlp.meta['lang']}_{nlp.meta['name']}-{nlp.meta['version']}"
+        run_id = store.start_run(os.path.abspath(input_folder), os.path.abspath(output_file_path), model,
+                                 list(selected_columns))
+    if resuming:
+        checkpoint.resume(output_file_path, checkpoint_columns, corpus_file, options)
+        out_file = open(output_file_path, 'a', encoding='utf-8')
+        if corpus_file is not None:
+            file_list = (record for record in file_list if not checkpoint.is_complete(record))
+            done = len(checkpoint.completed)
+        else:
+            file_list = [file_name for file_name in file_list if not checkpoint.is_complete(file_name)]
+            done = total_files - len(file_list)
+    else:
+        out_file = open(output_file_path, 'w+', encoding='utf-8')
+        out_file.write(format_header(selected_columns, meta_fields))
+        if checkpoint is not None:
+            out_file.flush()
+            checkpoint.start(checkpoint_columns, out_file.tell(), corpus_file, options)
+        done = 0
+
+    def write_row(file_name, word_count, results, timings, matches):
+        nonlocal done
+        write_start = time.perf_counter()
+        out_file.write(format_row(file_name, word_count, results, selected_columns))
+        if exporter is not None:
+            exporter.write(file_label(file_name), matches)
+        if store is not None:
+            store.add_file(run_id, file_label(file_name), word_count, results, matches if db_matches else None)
+        if checkpoint is not None:
+            checkpoint.record(file_name, out_file)
+        done += 1
+        if profile is not None:
+            timings['write'] = time.perf_counter() - write_start
+            profile.add_file(input_name(file_name), word_count, timings)
+
+        if progress_callback is not None:
+            # The total of a corpus file is an estimate when quoted CSV fields span lines
+            progress_callback(done, max(done, total_files))
+
+    rows = analyze_files(file_list, nlp=nlp, model_name=model_name, batch_size=batch_size, n_process=n_process,
+                         features=features, cache_dir=cache_dir, cache_size=cache_size,
+                         chunk_size=chunk_size, profile=profile is not None, rules_path=rules_path,
+                         sentence_memo=sentence_memo, read_ahead=read_ahead, read_threads=read_threads, pool=pool,
+                         export_matches=export_matches)
+    writer = _RowWriter(write_row, write_behind) if write_behind else None
+    try:
+        for row in rows:
+            if should_stop is not None and should_stop():
+                break
+            if writer is not None:
+                writer.put(row)
+            else:
+                write_row(*row)
+        else:
+            if writer is not None:
+                writer.close()
+                writer = None
+            if store is not None:
+                store.finish_run(run_id)
+    finally:
+        # Shuts down the worker pool right away when the run stops early
+        rows.close()
+        try:
+            if writer is not None:
+                writer.close()
+        finally:
+            if checkpoint is not None:
+                checkpoint.sync(out_file)
+            out_file.close()
+            if checkpoint is not None:
+                checkpoint.close()
+            if exporter is not None:
+                exporter.close()
+            if store is not None:
+                store.close()
+
+    if profile is not None:
+        profile.seconds = time.perf_counter() - run_start
+        profile.save(output_file_path)
+    return done
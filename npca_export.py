@@ -0,0 +1,95 @@
+############# NPC Analyzer: match export ##############
+# Optional export of every matched structure, for auditing the counts: one record per match
+#   file        the input, as in the "file" column of the CSV
+#   feature     structure prefix (adj, rc, ...)
+#   sentence    index of the sentence holding the head noun, counted over the whole text
+#   start_char, end_char  character offsets of the phrase span in the text as read (decoded,
+#               line endings translated), end exclusive
+#   head_lemma  lemma of the head noun (null if the pipeline has no lemmatizer)
+#   phrase      the phrase, as the count_* function writes it
+# Matches are written as each file finishes, in batches of at most batch_size records, so a
+# corpus with millions of them is never held in memory. The format follows the extension:
+# .jsonl (or .jsonl.gz), one JSON object per line, or .parquet, one row group per batch
+# (Parquet needs pyarrow).
+
+import gzip
+import json
+
+EXPORT_FIELDS = ['file', 'feature', 'sentence', 'start_char', 'end_char', 'head_lemma', 'phrase']
+EXPORT_FORMATS = ['.jsonl', '.jsonl.gz', '.parquet']
+
+# Records buffered before they are written
+DEFAULT_EXPORT_BATCH = 10000
+
+
+def export_format(path):
+    for suffix in EXPORT_FORMATS:
+        if path.lower().endswith(suffix):
+            return suffix
+    raise ValueError(f'Cannot export matches to "{path}": expected a file ending in one of {EXPORT_FORMATS}.')
+
+
+class MatchExporter:
+    """
+    Streams match records to a JSONL or Parquet file.
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_EXPORT_BATCH):
+        self.path = path
+        self.batch_size = batch_size
+        self.records = 0
+        self._format = export_format(path)
+        self._batch = []
+        self._file = None
+        self._parquet = None
+        if self._format == '.parquet':
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ValueError('Exporting matches to Parquet needs pyarrow (pip install pyarrow), '
+                                 'or export to .jsonl instead.') from None
+            self._pyarrow = pyarrow
+            self._schema = pyarrow.schema([
+                ('file', pyarrow.string()), ('feature', pyarrow.string()), ('sentence', pyarrow.int32()),
+                ('start_char', pyarrow.int64()), ('end_char', pyarrow.int64()), ('head_lemma', pyarrow.string()),
+                ('phrase', pyarrow.string())])
+            self._parquet = pyarrow.parquet.ParquetWriter(path, self._schema)
+        elif self._format == '.jsonl.gz':
+            self._file = gzip.open(path, 'wt', encoding='utf-8')
+        else:
+            self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, file_label, matches):
+        """
+        Add the matches of one file: (feature, sentence, start_char, end_char,
+        head_lemma, phrase) tuples.
+        """
+        for match in matches:
+            self._batch.append((file_label,) + tuple(match))
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        if self._parquet is not None:
+            columns = list(zip(*self._batch))
+            table = self._pyarrow.Table.from_arrays(
+                [self._pyarrow.array(column, type=field.type) for column, field in zip(columns, self._schema)],
+                schema=self._schema)
+            self._parquet.write_table(table)
+        else:
+            self._file.write(''.join(json.dumps(dict(zip(EXPORT_FIELDS, record)), ensure_ascii=False) + '\n'
+                                     for record in self._batch))
+        self.records += len(self._batch)
+        self._batch = []
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._parquet is not None:
+                self._parquet.close()
+            if self._file is not None:
+                self._file.close()
@@ -0,0 +1,470 @@
+############# NPC Analyzer: feature extractors ##############
+# The ten noun phrase structures counted by the NPC analyzer (Biber et al., 2011).
+# Each count_* function takes a parsed spaCy Doc and returns the list of matched phrases;
+# the analyzer only needs len() of each list, which count_all computes without building
+# any phrase strings.
+# This module has no GUI dependencies so it can be imported from headless scripts.
+
+NOMINAL_POS = {"NOUN", "PRON"}
+RELATIVIZERS = {"who", "which", "that", "whom", "whose"}
+NONFINITE_TAGS = {"VBG", "VBN", "VB"}
+
+
+def normed(count, word_count):
+    return round(count / word_count * 1000, 2) if word_count else 0
+
+def sorted_text(tokens):
+    return " ".join(tok.text for tok in sorted(set(tokens), key=lambda x: x.i))
+
+def has_finite_verb(tokens):
+    return any(tok.pos_ in {"VERB", "AUX"} and tok.tag_ not in NONFINITE_TAGS for tok in tokens)
+
+def rc_clause(head, child):
+    """
+    Tokens of the finite relative clause introduced by the right dependent
+    `child` of `head`, or None if `child` does not start one.
+    """
+    # Case 1: relativizer directly attached near the noun
+    if child.text.lower() in RELATIVIZERS:
+        # Look for a finite verb / auxiliary associated with the clause
+        clause_tokens = [child] + list(child.subtree)
+        if has_finite_verb(clause_tokens):
+            return clause_tokens
+
+    # Case 2: clause attached as acl/relcl to the noun
+    elif child.dep_ in {"acl", "relcl"}:
+        subtree = list(child.subtree)
+
+        has_relativizer = any(tok.text.lower() in RELATIVIZERS for tok in subtree)
+        if has_relativizer and has_finite_verb(subtree):
+            return subtree
+
+    return None
+
+def rc_phrase(head, child):
+    clause_tokens = rc_clause(head, child)
+    if clause_tokens is None:
+        return None
+    if child.text.lower() in RELATIVIZERS:
+        phrase = sorted_text(clause_tokens)
+    else:
+        phrase = " ".join(tok.text for tok in clause_tokens)
+    return f"{head.text} {phrase}".strip()
+
+def comp_clause(head, child):
+    """
+    Tokens of the noun complement clause introduced by the right dependent
+    `child` of `head`, or None if `child` does not start one.
+    """
+    # 1) that-clause complement:
+    if child.text.lower() == "that" and child.pos_ == "SCONJ" and child.dep_ == "mark":
+        clause_head = child.head
+
+        # Make sure this clause is linked back to the noun
+        if clause_head.i > head.i:
+            subtree = list(clause_head.subtree)
+
+            has_relativizer = any(
+                tok.text.lower() in {"who", "which", "whom", "whose"}
+                for tok in subtree
+            )
+
+            if has_finite_verb(subtree) and not has_relativizer:
+                return subtree
+
+    # 2) to-infinitive complement:
+    elif child.dep_ == "acl" and child.tag_ == "VB":
+        subtree = list(child.subtree)
+        has_to = any(tok.text.lower() == "to" and tok.dep_ == "aux" for tok in subtree)
+        if has_to:
+            return subtree
+
+    # where spaCy labels infinitival postmodifiers differently
+    elif child.dep_ == "acl" and child.pos_ == "VERB":
+        subtree = list(child.subtree)
+        has_to = any(tok.text.lower() == "to" for tok in subtree)
+        is_nonfinite = child.tag_ == "VB"
+        if has_to and is_nonfinite:
+            return subtree
+
+    return None
+
+def comp_phrase(head, child):
+    subtree = comp_clause(head, child)
+    if subtree is None:
+        return None
+    phrase = " ".join(tok.text for tok in subtree)
+    return f"{head.text} {phrase}".strip()
+
+def is_ml(prep):
+    """
+    True if `prep` is a prepositional dependent whose object carries another PP.
+    """
+    if prep.dep_ != "prep":
+        return False
+    for pobj in prep.children:
+        if pobj.dep_ == "pobj":
+            for child in pobj.children:
+                if child.dep_ == "prep":
+                    return True
+    return False
+
+def ml_phrase(head, prep):
+    """
+    Noun + PP postmodifier whose object carries another PP, or None if
+    `prep` is not such a prepositional dependent of `head`.
+    """
+    if not is_ml(prep):
+        return None
+
+    phrase_tokens = [head] + list(prep.subtree)
+
+    # Find object of the first PP
+    for pobj in prep.children:
+        if pobj.dep_ == "pobj":
+            # Add every PP embedded in the object
+            for child in pobj.children:
+                if child.dep_ == "prep":
+                    phrase_tokens.extend(list(child.subtree))
+
+    return sorted_text(phrase_tokens)
+
+def count_adj(doc):
+    """
+    Attributive adjectives as premodifiers.
+    e.g.,
+        a nice flavor
+        the red car
+
+    Excludes predicative adjectives:
+        e.g., the car is nice
+    """
+    results = []
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        for child in head.lefts:
+            # adjectival modifier directly attached to noun
+            if child.dep_ == "amod" and child.pos_ == "ADJ":
+                results.append(f"{child.text} {head.text}")
+
+    return results
+
+def count_rc(doc):
+    """
+    Count finite relative clauses modifying nouns/pronouns.
+    e.g.,
+        the man who was nice to me
+        the book that I bought
+        the person who lives next door
+
+    """
+    results = []
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        # Search descendants / nearby right dependents for a relativizer
+        # that introduces a finite clause attached to this noun.
+        for child in head.rights:
+            phrase = rc_phrase(head, child)
+            if phrase is not None:
+                results.append(phrase)
+
+    return results
+
+def count_nm(doc):
+    """
+    Nouns as premodifiers.
+
+    e.g.,
+        cable channel
+        school teacher
+        government report
+    """
+    results = []
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        for child in head.lefts:
+            if child.pos_ == "NOUN" and child.dep_ == "compound":
+                results.append(f"{child.text} {head.text}")
+
+    return results
+
+def count_poss(doc):
+    """
+    Possessive nouns as premodifiers.
+
+    e.g.,
+        Mary's voice
+        the student's book
+        John's car
+    """
+    results = []
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        for child in head.lefts:
+            if child.dep_ == "poss":
+                results.append(f"{child.text} {head.text}")
+
+    return results
+
+def count_of(doc):
+    """
+    Of-phrases as noun postmodifiers.
+    Examples:
+        chair of the committee
+        the end of the road
+    """
+    results = []
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        for child in head.children:
+            # prepositional dependent headed by "of"
+            if child.dep_ == "prep" and child.text.lower() == "of":
+                phrase = sorted_text(child.subtree)
+                results.append(f"{head.text} {phrase}")
+    return results
+
+
+def count_prep(doc):
+    """
+    Simple prepositional phrases as postmodifiers of nouns,
+    excluding of-phrases
+
+    e.g.,
+        house in the country
+        students with good grades
+        the book on the table
+    """
+    results = []
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        for child in head.children:
+            if child.dep_ == "prep" and child.text.lower() != "of":
+                phrase = " ".join(tok.text for tok in child.subtree)
+                results.append(f"{head.text} {phrase}")
+
+    return results
+
+def count_nonf(doc):
+    """
+    Nonfinite relative clauses as postmodifiers.
+    e.g.,
+        students studying abroad
+        the method used in the experiment
+        a book written by Orwell
+
+    Targets participial clause postmodifiers attached to nouns.
+    """
+    results = []
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        for child in head.children:
+            # participial clausal modifier of the noun
+            if child.dep_ == "acl" and child.tag_ in {"VBG", "VBN"}:
+                phrase = sorted_text(child.subtree)
+                results.append(f"{head.text} {phrase}")
+
+    return results
+
+def count_adj_nm(doc):
+    """
+    Multiple premodifiers: adjective + noun + head noun
+    e.g.,
+        medical school teacher
+        large government report
+
+    Requires at least one adjectival premodifier and one noun premodifier attached to the same head noun.
+    """
+    results = []
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        adjs = []
+        nouns = []
+
+        for child in head.lefts:
+            if child.dep_ == "amod" and child.pos_ == "ADJ":
+                adjs.append(child)
+            elif child.dep_ == "compound" and child.pos_ == "NOUN":
+                nouns.append(child)
+
+        if adjs and nouns:
+            phrase_tokens = adjs + nouns + [head]
+            phrase = sorted_text(phrase_tokens)
+            results.append(phrase)
+
+    return results
+
+def count_comp(doc):
+    """
+    Count noun complement clauses used as postmodifiers.
+    e.g.,
+        the fact that he left
+        the idea that we should wait
+        a chance to win
+        permission to leave
+
+    - Includes both that-clause complements and to-infinitive complements.
+
+    """
+    results = []
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        for child in head.rights:
+            phrase = comp_phrase(head, child)
+            if phrase is not None:
+                results.append(phrase)
+    return results
+
+def count_ml(doc):
+    """
+    Multiple prepositional phrase embeddings as postmodifiers.
+    e.g.,
+        the development of structural complexity through recursive expansion
+        the presence of layered structures at the borderline of cell territories
+
+    This function identifies noun heads followed by a PP postmodifier
+    whose object contains another PP, indicating embedded PP structure.
+    """
+    results = []
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        for prep in head.children:
+            phrase = ml_phrase(head, prep)
+            if phrase is not None:
+                results.append(phrase)
+
+    return results
+
+
+# Feature prefixes in the order they appear in the output columns of the GUI
+FEATURES = ['adj', 'rc', 'nm', 'poss', 'of', 'prep', 'nonf', 'adj_nm', 'comp', 'ml']
+
+EXTRACTORS = {
+    'adj': count_adj,
+    'rc': count_rc,
+    'nm': count_nm,
+    'poss': count_poss,
+    'of': count_of,
+    'prep': count_prep,
+    'nonf': count_nonf,
+    'adj_nm': count_adj_nm,
+    'comp': count_comp,
+    'ml': count_ml,
+}
+
+# Structures decided by the left dependents of a head, by any dependent, and by the right dependents
+_LEFT_FEATURES = {'adj', 'nm', 'poss', 'adj_nm'}
+_CHILD_FEATURES = {'of', 'prep', 'nonf', 'ml'}
+_RIGHT_FEATURES = {'rc', 'comp'}
+
+def extract_all(doc, features=None):
+    """
+    Phrases of all ten structures from one walk over the Doc.
+
+    Returns {feature: phrases} for the requested features (all ten by default),
+    where every list is identical to what the matching count_* function returns
+    for the same Doc. Structures that were not requested are not computed.
+    The walk is the one of npca_matches.MatchStore, which records every match
+    and renders its phrase.
+    """
+    # Imported here: npca_matches builds on the helpers of this module
+    from npca_matches import MatchStore
+
+    store = MatchStore.from_doc(doc, features)
+    return {feature: store.phrases(doc, feature) for feature in store.features}
+
+
+def count_all(doc, features=None):
+    """
+    Count-only version of extract_all.
+
+    Returns {feature: count} for the requested features (all ten by default),
+    where every count equals len() of the matching count_* list, but no phrase
+    strings are built. Use extract_all when the phrases themselves are needed.
+    """
+    wanted = set(FEATURES) if features is None else set(features)
+    # Cheap structures are counted whenever their dependents are scanned; only the
+    # clause checks, which walk subtrees, are skipped when not requested
+    want_rc, want_comp, want_ml = 'rc' in wanted, 'comp' in wanted, 'ml' in wanted
+    adj = rc = nm = poss = of = prep = nonf = adj_nm = comp = ml = 0
+
+    scan_lefts = bool(wanted & _LEFT_FEATURES)
+    scan_children = bool(wanted & _CHILD_FEATURES)
+    scan_rights = bool(wanted & _RIGHT_FEATURES)
+
+    for head in doc:
+        if head.pos_ not in NOMINAL_POS:
+            continue
+
+        children = []
+        if scan_lefts or scan_children:
+            n_adjs = 0
+            n_nouns = 0
+            for child in head.lefts:
+                dep = child.dep_
+                if dep == "amod" and child.pos_ == "ADJ":
+                    n_adjs += 1
+                elif dep == "compound" and child.pos_ == "NOUN":
+                    n_nouns += 1
+                elif dep == "poss":
+                    poss += 1
+                if scan_children:
+                    children.append(child)
+            adj += n_adjs
+            nm += n_nouns
+            if n_adjs and n_nouns:
+                adj_nm += 1
+
+        if scan_rights or scan_children:
+            for child in head.rights:
+                if scan_children:
+                    children.append(child)
+                if want_rc and rc_clause(head, child) is not None:
+                    rc += 1
+                if want_comp and comp_clause(head, child) is not None:
+                    comp += 1
+
+        for child in children:
+            dep = child.dep_
+            if dep == "prep":
+                if child.text.lower() == "of":
+                    of += 1
+                else:
+                    prep += 1
+                if want_ml and is_ml(child):
+                    ml += 1
+            elif dep == "acl" and child.tag_ in {"VBG", "VBN"}:
+                nonf += 1
+
+    counts = {'adj': adj, 'rc': rc, 'nm': nm, 'poss': poss, 'of': of, 'prep': prep, 'nonf': nonf,
+              'adj_nm': adj_nm, 'comp': comp, 'ml': ml}
+    return {feature: counts[feature] for feature in FEATURES if feature in wanted}
@@ -0,0 +1,206 @@
+############# NPC Analyzer: match store ##############
+# Compact record of the structures found in one Doc, for code that needs more than the counts
+# (exports, inspection) without holding a list of phrase strings per structure.
+# Every match is one row of five integers in an int32 NumPy array:
+#   feature  index of the structure in FEATURES
+#   head     index of the head noun
+#   child    index of the dependent that introduces the structure (-1 for adj_nm, which has
+#            several)
+#   start, end  token span covered by the phrase (end exclusive)
+# Phrase strings are only rendered, from the Doc, when asked for; they are the same strings
+# the count_* functions return. A store is 20 bytes per match and pickles, or converts with
+# to_bytes(), as one buffer, so it is cheap to send between processes.
+# extract_all() (npca_features) is built on the store, and match_records() turns a store
+# into the records of the match export (see npca_export).
+# e.g.,
+#   store = MatchStore.from_doc(doc)
+#   store.counts()             -> {'adj': 3, 'rc': 1, ...}
+#   store.phrases(doc, 'of')   -> ['chair of the committee', ...]
+
+from array import array
+from bisect import bisect_right
+
+import numpy
+
+from npca_features import (_CHILD_FEATURES, _LEFT_FEATURES, _RIGHT_FEATURES, FEATURES, NOMINAL_POS, comp_clause,
+                           comp_phrase, is_ml, ml_phrase, rc_clause, rc_phrase, sorted_text)
+
+FEATURE_IDS = {feature: i for i, feature in enumerate(FEATURES)}
+FIELDS = ['feature', 'head', 'child', 'start', 'end']
+
+
+def _premodifiers(head):
+    # Adjective and noun premodifiers of head, as count_adj_nm collects them
+    adjs = []
+    nouns = []
+    for child in head.lefts:
+        if child.dep_ == "amod" and child.pos_ == "ADJ":
+            adjs.append(child)
+        elif child.dep_ == "compound" and child.pos_ == "NOUN":
+            nouns.append(child)
+    return adjs, nouns
+
+
+def render(doc, feature, head, child):
+    """
+    Phrase of one match, as the count_* function of feature writes it.
+    """
+    head = doc[head]
+    if feature == 'adj_nm':
+        adjs, nouns = _premodifiers(head)
+        return sorted_text(adjs + nouns + [head])
+    child = doc[child]
+    if feature in ('adj', 'nm', 'poss'):
+        return f"{child.text} {head.text}"
+    if feature in ('of', 'nonf'):
+        return f"{head.text} {sorted_text(child.subtree)}"
+    if feature == 'prep':
+        return f"{head.text} {' '.join(tok.text for tok in child.subtree)}"
+    if feature == 'rc':
+        return rc_phrase(head, child)
+    if feature == 'comp':
+        return comp_phrase(head, child)
+    return ml_phrase(head, child)
+
+
+class MatchStore:
+    """
+    Matches of the requested features in one Doc, one int32 row each (see FIELDS),
+    in the order of their head nouns; the rows of each feature are in count_* order.
+    """
+
+    def __init__(self, rows, features=None):
+        self.rows = rows
+        self.features = list(FEATURES) if features is None else [f for f in FEATURES if f in features]
+
+    @classmethod
+    def from_doc(cls, doc, features=None):
+        wanted = set(FEATURES) if features is None else set(features)
+        rows = array('i')
+
+        def add(feature, head, child, tokens):
+            indexes = [tok.i for tok in tokens]
+            indexes.append(head.i)
+            rows.extend((FEATURE_IDS[feature], head.i, child, min(indexes), max(indexes) + 1))
+
+        def add_child(head, child):
+            # Structures matched on any dependent of the head (count_of, count_prep, count_nonf, count_ml)
+            if child.dep_ == "prep":
+                if child.text.lower() == "of":
+                    if 'of' in wanted:
+                        add('of', head, child.i, child.subtree)
+                elif 'prep' in wanted:
+                    add('prep', head, child.i, child.subtree)
+                if 'ml' in wanted and is_ml(child):
+                    add('ml', head, child.i, child.subtree)
+            elif 'nonf' in wanted and child.dep_ == "acl" and child.tag_ in {"VBG", "VBN"}:
+                add('nonf', head, child.i, child.subtree)
+
+        scan_lefts = bool(wanted & _LEFT_FEATURES)
+        scan_children = bool(wanted & _CHILD_FEATURES)
+        scan_rights = bool(wanted & _RIGHT_FEATURES)
+
+        for head in doc:
+            if head.pos_ not in NOMINAL_POS:
+                continue
+
+            if scan_lefts or scan_children:
+                adjs = []
+                nouns = []
+                for child in head.lefts:
+                    dep = child.dep_
+                    if dep == "amod" and child.pos_ == "ADJ":
+                        adjs.append(child)
+                        if 'adj' in wanted:
+                            add('adj', head, child.i, [child])
+                    elif dep == "compound" and child.pos_ == "NOUN":
+                        nouns.append(child)
+                        if 'nm' in wanted:
+                            add('nm', head, child.i, [child])
+                    if dep == "poss" and 'poss' in wanted:
+                        add('poss', head, child.i, [child])
+                    if scan_children:
+                        add_child(head, child)
+
+                if 'adj_nm' in wanted and adjs and nouns:
+                    add('adj_nm', head, -1, adjs + nouns)
+
+            if scan_rights or scan_children:
+                for child in head.rights:
+                    if scan_children:
+                        add_child(head, child)
+                    if 'rc' in wanted:
+                        clause = rc_clause(head, child)
+                        if clause is not None:
+                            add('rc', head, child.i, clause)
+                    if 'comp' in wanted:
+                        clause = comp_clause(head, child)
+                        if clause is not None:
+                            add('comp', head, child.i, clause)
+
+        return cls(numpy.frombuffer(rows, dtype=numpy.int32).reshape(-1, len(FIELDS)), wanted)
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def nbytes(self):
+        return self.rows.nbytes
+
+    def counts(self):
+        """
+        {feature: count} for the features of the store, equal to len() of the
+        matching count_* lists.
+        """
+        totals = numpy.bincount(self.rows[:, 0], minlength=len(FEATURES))
+        return {feature: int(totals[FEATURE_IDS[feature]]) for feature in self.features}
+
+    def select(self, feature):
+        """
+        Rows of one feature, in count_* order.
+        """
+        return self.rows[self.rows[:, 0] == FEATURE_IDS[feature]]
+
+    def phrases(self, doc, feature):
+        """
+        Phrases of one feature rendered from doc, the Doc the store was built
+        from; the same list as the count_* function returns.
+        """
+        return [render(doc, feature, int(head), int(child)) for _, head, child, _, _ in self.select(feature)]
+
+    def to_bytes(self):
+        return self.rows.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data, features=None):
+        return cls(numpy.frombuffer(data, dtype=numpy.int32).reshape(-1, len(FIELDS)), features)
+
+
+def sentence_starts(doc):
+    """
+    Index of the first token of every sentence of doc, or None if doc has no
+    sentence boundaries.
+    """
+    if not doc.has_annotation('SENT_START'):
+        return None
+    return [sent.start for sent in doc.sents]
+
+
+def match_records(doc, features=None, char_offset=0, sentence_offset=0, starts=None):
+    """
+    (feature, sentence, start_char, end_char, head_lemma, phrase) of every match
+    of the features in doc, in store order. For a Doc that is one chunk of a
+    longer text, char_offset and sentence_offset shift the offsets to that text.
+    starts are the sentence_starts() of doc, if already known; sentence is None
+    when doc has no sentence boundaries.
+    """
+    if starts is None:
+        starts = sentence_starts(doc)
+    records = []
+    for feature_id, head, child, start, end in MatchStore.from_doc(doc, features).rows.tolist():
+        feature = FEATURES[feature_id]
+        span = doc[start:end]
+        sentence = None if starts is None else sentence_offset + bisect_right(starts, head) - 1
+        records.append((feature, sentence, char_offset + span.start_char, char_offset + span.end_char,
+                        doc[head].lemma_ or None, render(doc, feature, head, child)))
+    return records
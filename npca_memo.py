@@ -0,0 +1,98 @@
+############# NPC Analyzer: sentence memo ##############
+# Optional sentence-level memoization for corpora with a lot of repeated material (essay
+# prompts pasted into every file, boilerplate headers, copied sentences).
+# Each text is split into sentences with a cheap rule (after ., ! or ? and at blank lines),
+# and every sentence is keyed by a hash of its whitespace-normalized text. The structure
+# counts of a sentence are computed once, kept in a bounded LRU, and a text's counts are the
+# sum over its sentences; only sentences not in the memo are parsed.
+#
+# Caveat: with the memo on, every sentence is parsed on its own, not inside its text.
+# The tagger and parser look at neighbouring words, and the rule-based split does not always
+# agree with the parser's own sentence boundaries, so a sentence can be tagged or attached
+# differently than in a full-text parse, and a structure spanning a split is lost. The counts
+# are the same for every copy of a sentence, but they can differ slightly from a run without
+# the memo; do not mix runs with and without it in one comparison.
+
+import hashlib
+import re
+from collections import OrderedDict
+
+# Sentences kept in the memo
+DEFAULT_MEMO_SIZE = 100000
+
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|\n\s*\n\s*')
+
+
+def split_sentences(text):
+    """
+    Split a text after sentence-final punctuation and at blank lines.
+    Empty pieces are dropped.
+    """
+    return [sentence for sentence in _SENTENCE_BREAK.split(text) if sentence.strip()]
+
+
+def normalize_sentence(sentence):
+    return ' '.join(sentence.split())
+
+
+class SentenceMemo:
+    """
+    Bounded LRU of structure counts per normalized sentence.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MEMO_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def key(self, sentence):
+        return hashlib.blake2b(sentence.encode('utf-8'), digest_size=16).digest()
+
+    def get(self, key):
+        counts = self._entries.get(key)
+        if counts is not None:
+            self._entries.move_to_end(key)
+        return counts
+
+    def put(self, key, counts):
+        self._entries[key] = counts
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pipe(self, text_contexts, parse, count, features):
+        """
+        Yield (counts, context) for every (text, context), in input order.
+
+        parse(sentence_contexts) parses (sentence, context) pairs like
+        nlp.pipe(..., as_tuples=True) and count(doc) returns the counts of a Doc;
+        both are only called for sentences not in the memo.
+        """
+        for text, context in text_contexts:
+            sentences = [normalize_sentence(sentence) for sentence in split_sentences(text)]
+            keys = [self.key(sentence) for sentence in sentences]
+
+            # Counts of every distinct sentence of this text, parsing the ones the memo lacks
+            known = {}
+            missing = {}
+            for key, sentence in zip(keys, sentences):
+                if key in known or key in missing:
+                    continue
+                counts = self.get(key)
+                if counts is None:
+                    missing[key] = sentence
+                else:
+                    known[key] = counts
+            if missing:
+                for doc, key in parse((sentence, key) for key, sentence in missing.items()):
+                    known[key] = count(doc)
+                    self.put(key, known[key])
+            self.misses += len(missing)
+            self.hits += len(keys) - len(missing)
+
+            totals = dict.fromkeys(features, 0)
+            for key in keys:
+                for feature, value in known[key].items():
+                    totals[feature] += value
+            yield totals, context
@@ -0,0 +1,141 @@
+############# NPC Analyzer: run profiling ##############
+# Opt-in per-file timing of a corpus run: reading, parsing, counting the structures and
+# writing the row, plus peak memory (of this process, and of the largest worker process,
+# which reports its own peak with the rows it sends back). The profile is saved next to the output CSV as
+# <output>.profile.json (totals, slowest files and every file) and <output>.profile.csv
+# (one row per file) so that slow files and hot extractors can be found after a run.
+# Counting time is split into the setup the structures share (extract_shared: the Doc's
+# attribute arrays, or the whole matcher pass of a rule set) and each structure's own step.
+
+import csv
+import json
+import sys
+
+from npca_features import FEATURES
+from npca_vector import SHARED
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+PROFILE_SUFFIX = '.profile'
+STAGE_NAMES = ['read', 'parse', 'extract', 'write']
+EXTRACT_KEYS = [SHARED] + FEATURES
+
+
+def _rss_mb(who):
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process in MB, or None where it cannot be read.
+    """
+    if resource is None:
+        return None
+    return _rss_mb(resource.RUSAGE_SELF)
+
+
+def new_timings():
+    return {'read': 0.0, 'parse': 0.0, 'extract': dict.fromkeys(EXTRACT_KEYS, 0.0), 'write': 0.0}
+
+
+def add_timings(total, timings):
+    for stage in ('read', 'parse', 'write'):
+        total[stage] += timings[stage]
+    for feature, seconds in timings['extract'].items():
+        total['extract'][feature] += seconds
+
+
+class RunProfile:
+    """
+    Timings of every file of one corpus run.
+    """
+
+    def __init__(self):
+        self.files = []
+        self.totals = new_timings()
+        self.words = 0
+        self.seconds = 0.0
+        self.worker_rss_mb = None
+
+    def add_file(self, file_name, word_count, timings):
+        extract = sum(timings['extract'].values())
+        total = timings['read'] + timings['parse'] + extract + timings['write']
+        self.files.append({'file': file_name, 'words': word_count, 'read': timings['read'],
+                           'parse': timings['parse'], 'extract': dict(timings['extract']),
+                           'write': timings['write'], 'total': total})
+        add_timings(self.totals, timings)
+        self.words += word_count
+        if timings.get('worker_rss_mb') is not None:
+            self.worker_rss_mb = max(self.worker_rss_mb or 0.0, timings['worker_rss_mb'])
+
+    def stage_totals(self):
+        return {'read': self.totals['read'], 'parse': self.totals['parse'],
+                'extract': sum(self.totals['extract'].values()), 'write': self.totals['write']}
+
+    def slowest_files(self, n=10):
+        return sorted(self.files, key=lambda record: record['total'], reverse=True)[:n]
+
+    def to_dict(self):
+        return {
+            'files_processed': len(self.files),
+            'words': self.words,
+            'wall_seconds': round(self.seconds, 4),
+            'stage_seconds': {stage: round(seconds, 4) for stage, seconds in self.stage_totals().items()},
+            'extractor_seconds': {feature: round(seconds, 4) for feature, seconds in self.totals['extract'].items()},
+            'peak_rss_mb': peak_rss_mb(),
+            'peak_worker_rss_mb': self.worker_rss_mb,
+            'slowest_files': [{'file': record['file'], 'words': record['words'], 'seconds': round(record['total'], 4)}
+                              for record in self.slowest_files()],
+            'files': self.files,
+        }
+
+    def save(self, output_file_path):
+        """
+        Write the JSON and CSV sidecars next to output_file_path and return their paths.
+        """
+        base = output_file_path[:-4] if output_file_path.endswith('.csv') else output_file_path
+        json_path = base + PROFILE_SUFFIX + '.json'
+        csv_path = base + PROFILE_SUFFIX + '.csv'
+
+        with open(json_path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+        with open(csv_path, 'w', encoding='utf-8', newline='') as file:
+            # File names and archive members may hold commas or quotes
+            writer = csv.writer(file, lineterminator='\n')
+            header = ['file', 'words', 'read', 'parse'] + [f'extract_{key}' for key in EXTRACT_KEYS]
+            header += ['write', 'total']
+            writer.writerow(header)
+            for record in self.files:
+                row = [record['file'], str(record['words']), f"{record['read']:.6f}", f"{record['parse']:.6f}"]
+                row += [f"{record['extract'][key]:.6f}" for key in EXTRACT_KEYS]
+                row += [f"{record['write']:.6f}", f"{record['total']:.6f}"]
+                writer.writerow(row)
+
+        return json_path, csv_path
+
+    def summary(self):
+        """
+        A few lines for the end-of-run dialog or console.
+        """
+        stages = self.stage_totals()
+        busy = sum(stages.values()) or 1.0
+        lines = [f'{len(self.files)} files, {self.words} words in {self.seconds:.1f} s']
+        lines.append(', '.join(f'{stage} {seconds:.1f} s ({seconds / busy:.0%})' for stage, seconds in stages.items()))
+        own = [(feature, self.totals['extract'][feature]) for feature in FEATURES]
+        hot = sorted(own, key=lambda item: item[1], reverse=True)[:3]
+        lines.append(f"Counting: shared setup {self.totals['extract'][SHARED]:.2f} s; slowest extractors: "
+                     + ', '.join(f'{feature} {seconds:.2f} s' for feature, seconds in hot))
+        slowest = self.slowest_files(1)
+        if slowest:
+            lines.append(f"Slowest file: {slowest[0]['file']} ({slowest[0]['total']:.1f} s)")
+        rss = peak_rss_mb()
+        if rss is not None:
+            workers = self.worker_rss_mb
+            lines.append(f'Peak memory: {rss:.0f} MB' + (f' (largest worker: {workers:.0f} MB)' if workers else ''))
+        return '\n'.join(lines)
@@ -0,0 +1,96 @@
+############# NPC Analyzer: rule engine ##############
+# Declarative version of the extractors: every structure is a set of spaCy
+# DependencyMatcher patterns loaded from a JSON config (npca_rules.json by default).
+# All patterns are compiled into one matcher, so each Doc is matched in a single call.
+#
+# A rule has
+#   "patterns": DependencyMatcher patterns (lists of node dicts with RIGHT_ID, REL_OP, ...);
+#               ">--" and ">++" select left and right children of the head
+#   "count_by": node names identifying one occurrence; matches sharing them count once
+#               (e.g. ["head"] counts heads, not every combination of their dependents)
+#   "filter":   optional name of a post-filter from FILTERS, called with the matched
+#               tokens by node name, for conditions a pattern cannot express
+#               (e.g. a finite verb somewhere in the clause)
+# e.g.,
+#   rules = RuleSet.from_file(nlp.vocab)
+#   counts = rules.count(doc)
+
+import json
+import os
+
+from spacy.matcher import DependencyMatcher
+
+from npca_features import comp_clause, rc_clause
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'npca_rules.json')
+
+FILTERS = {
+    'rc_clause': lambda tokens: rc_clause(tokens['head'], tokens['child']) is not None,
+    'comp_clause': lambda tokens: comp_clause(tokens['head'], tokens['child']) is not None,
+}
+
+
+class RuleSet:
+    """
+    Compiled structure rules. Raises ValueError for an unknown filter or a
+    count_by node that is not in every pattern of the rule.
+    """
+
+    def __init__(self, vocab, rules):
+        self.rules = rules
+        self.matcher = DependencyMatcher(vocab)
+        # Every pattern gets its own match key, mapped back to (rule name, node names)
+        self._patterns = {}
+        for name, rule in rules.items():
+            if rule.get('filter') is not None and rule['filter'] not in FILTERS:
+                raise ValueError(f'Unknown filter "{rule["filter"]}" in rule "{name}".')
+            for i, pattern in enumerate(rule['patterns']):
+                node_names = [node['RIGHT_ID'] for node in pattern]
+                missing = [node for node in rule['count_by'] if node not in node_names]
+                if missing:
+                    raise ValueError(f'Rule "{name}" counts by {missing}, which a pattern does not name.')
+                key = f'{name}/{i}'
+                self.matcher.add(key, [pattern])
+                self._patterns[vocab.strings[key]] = (name, node_names)
+
+    @classmethod
+    def from_file(cls, vocab, path=DEFAULT_RULES_PATH):
+        with open(path, encoding='utf-8') as file:
+            return cls(vocab, json.load(file))
+
+    def names(self):
+        return list(self.rules)
+
+    def matches(self, doc, names=None):
+        """
+        {rule name: set of occurrences}, each occurrence being the tuple of
+        token indices of the rule's count_by nodes.
+        """
+        wanted = set(self.rules) if names is None else set(names)
+        found = {name: set() for name in self.rules if name in wanted}
+        for match_id, token_ids in self.matcher(doc):
+            name, node_names = self._patterns[match_id]
+            if name not in wanted:
+                continue
+            rule = self.rules[name]
+            # token_ids holds the token matched by each node, in pattern order
+            tokens = {node: doc[i] for node, i in zip(node_names, token_ids)}
+            occurrence = tuple(tokens[node].i for node in rule['count_by'])
+            if occurrence in found[name]:
+                continue
+            if rule.get('filter') is not None and not FILTERS[rule['filter']](tokens):
+                continue
+            found[name].add(occurrence)
+        return found
+
+    def count(self, doc, features=None):
+        """
+        {feature: count} for the requested structures (every rule by default).
+        Raises ValueError if a requested structure has no rule.
+        """
+        names = self.names() if features is None else features
+        missing = [name for name in names if name not in self.rules]
+        if missing:
+            raise ValueError(f'No rule for {missing} in the rule config.')
+        found = self.matches(doc, names)
+        return {name: len(found[name]) for name in names}
@@ -0,0 +1,351 @@
+############# NPC Analyzer: analysis service ##############
+# Long-running local service that keeps the spaCy pipeline loaded and returns the same raw
+# and normed values as the CSV columns, for tools that need counts on demand.
+# HTTP/JSON on localhost (or on a Unix socket):
+#   POST /analyze   {"text": "..."} or {"texts": ["...", ...]}, optionally "features": ["adj", ...]
+#                   -> {"result": {...}} or {"results": [{...}, ...]}, each with "Number of words"
+#                      and the <feature>_raw / <feature>_normed values
+#   GET  /health    -> {"status": "ok", ...}
+#   GET  /metrics   -> request, text and batch counters, queue depth and timings
+# Texts of concurrent requests are coalesced into nlp.pipe micro-batches: a batch is parsed
+# as soon as it holds --max-batch texts or its first text has waited --max-wait-ms. When
+# more than --max-queue texts are waiting, new requests are refused with 503 (backpressure).
+# With --workers N, each batch is spread over a pool of N worker processes forked once at
+# start-up from the loaded pipeline (see WorkerPool) instead of being parsed in-process.
+# e.g.,
+#   python npca_server.py --port 8765
+#   python npca_server.py --socket /tmp/npca.sock --max-batch 64 --max-wait-ms 20
+#   python npca_server.py --workers 8 --max-batch 64
+#   curl -s localhost:8765/analyze -d '{"text": "The chair of the committee was nice."}'
+
+import argparse
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from npca_corpus import Record
+from npca_engine import (MODEL_NAME, WorkerPool, analyze_files, count_features, load_model, plan_components,
+                         results_from_counts)
+from npca_features import FEATURES
+from npca_stream import iter_text_chunks
+
+DEFAULT_PORT = 8765
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT = 0.01  # seconds
+DEFAULT_MAX_QUEUE = 1000
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 50 * 1024 * 1024
+# Seconds a request waits for its results before giving up
+REQUEST_TIMEOUT = 300
+
+
+class Overloaded(Exception):
+    pass
+
+
+class MicroBatcher:
+    """
+    Collects texts from concurrent requests and parses them together.
+
+    submit() queues the texts of one request and returns one Future per text;
+    a single worker thread takes up to max_batch texts at a time (waiting at
+    most max_wait seconds for a batch to fill) and runs them through nlp.pipe,
+    or hands them to the worker processes of pool, a WorkerPool.
+    """
+
+    def __init__(self, nlp, max_batch=DEFAULT_MAX_BATCH, max_wait=DEFAULT_MAX_WAIT, max_queue=DEFAULT_MAX_QUEUE,
+                 chunk_size=None, pool=None):
+        self.nlp = nlp
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.chunk_size = chunk_size
+        self.metrics = {'texts': 0, 'batches': 0, 'rejected': 0, 'errors': 0, 'parse_seconds': 0.0,
+                        'wait_seconds': 0.0}
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='npca-batcher', daemon=True)
+        self._thread.start()
+
+    def queue_depth(self):
+        with self._condition:
+            return len(self._queue)
+
+    def submit(self, texts, features):
+        """
+        Queue the texts of one request; raises Overloaded if they do not fit.
+        """
+        futures = [Future() for _ in texts]
+        now = time.perf_counter()
+        with self._condition:
+            # All or nothing, so that a request is never half analyzed
+            if len(self._queue) + len(texts) > self.max_queue:
+                self.metrics['rejected'] += 1
+                raise Overloaded(f'{len(self._queue)} of at most {self.max_queue} texts are waiting; '
+                                 'try again later.')
+            for text, future in zip(texts, futures):
+                self._queue.append((text, features, future, now))
+            self._condition.notify()
+        return futures
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queue and not self._stopped:
+                self._condition.wait()
+            if self._stopped:
+                return None
+            deadline = self._queue[0][3] + self.max_wait
+            while len(self._queue) < self.max_batch and not self._stopped:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            try:
+                self._analyze(batch)
+            except Exception as e:
+                self.metrics['errors'] += 1
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _analyze(self, batch):
+        start = time.perf_counter()
+        features = [feature for feature in FEATURES if any(feature in item[1] for item in batch)]
+        if self.pool is not None:
+            counts = self._pooled_counts(batch, features)
+        else:
+            counts = self._counts(batch, features)
+
+        for (text, _, future, queued), text_counts in zip(batch, counts):
+            word_count = len(text.split())
+            result = {'Number of words': word_count}
+            result.update(results_from_counts(text_counts, word_count))
+            future.set_result(result)
+            self.metrics['wait_seconds'] += start - queued
+        self.metrics['texts'] += len(batch)
+        self.metrics['batches'] += 1
+        self.metrics['parse_seconds'] += time.perf_counter() - start
+
+    def _counts(self, batch, features):
+        _, disabled = plan_components(self.nlp.pipe_names, features)
+
+        # Long texts are parsed in chunks, as in a corpus run, and their counts summed
+        chunk_size = self.chunk_size or self.nlp.max_length
+
+        def text_contexts():
+            for i, (text, _, _, _) in enumerate(batch):
+                for chunk in iter_text_chunks(io.StringIO(text), chunk_size):
+                    yield chunk, i
+
+        counts = [dict.fromkeys(item[1], 0) for item in batch]
+        docs = self.nlp.pipe(text_contexts(), as_tuples=True, batch_size=self.max_batch, disable=disabled)
+        for doc, i in docs:
+            for feature, count in count_features(doc, batch[i][1]).items():
+                counts[i][feature] += count
+        return counts
+
+    def _pooled_counts(self, batch, features):
+        # The texts are split evenly over the workers, which return one row per text, in order
+        records = [Record(i, str(i), item[0], ()) for i, item in enumerate(batch)]
+        batch_size = -(-len(records) // self.pool.n_process)
+        rows = analyze_files(records, batch_size=batch_size, features=features, chunk_size=self.chunk_size,
+                             pool=self.pool)
+        return [{feature: results[f'{feature}_raw'] for feature in item[1]}
+                for item, (_, _, results, _, _) in zip(batch, rows)]
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    server_version = 'NPCAnalyzer/1.0'
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok', 'model': self.server.model_name,
+                                  'queue_depth': self.server.batcher.queue_depth()})
+        elif self.path == '/metrics':
+            self._send_json(200, self.server.metrics())
+        else:
+            self._send_json(404, {'error': f'Unknown path "{self.path}".'})
+
+    def do_POST(self):
+        if self.path != '/analyze':
+            self._send_json(404, {'error': f'Unknown path "{self.path}".'})
+            return
+        self.server.count('requests')
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_SIZE:
+            self._send_json(413, {'error': f'Request body larger than {MAX_BODY_SIZE} bytes.'})
+            return
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+            texts, single, features = self._parse_request(request)
+        except ValueError as e:
+            self.server.count('bad_requests')
+            self._send_json(400, {'error': str(e)})
+            return
+
+        if len(texts) > self.server.batcher.max_queue:
+            self._send_json(413, {'error': f'At most {self.server.batcher.max_queue} texts per request.'})
+            return
+        try:
+            futures = self.server.batcher.submit(texts, features)
+        except Overloaded as e:
+            self._send_json(503, {'error': str(e)}, {'Retry-After': '1'})
+            return
+        try:
+            results = [future.result(REQUEST_TIMEOUT) for future in futures]
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, {'result': results[0]} if single else {'results': results})
+
+    def _parse_request(self, request):
+        if not isinstance(request, dict):
+            raise ValueError('Expected a JSON object.')
+        if 'text' in request:
+            texts, single = [request['text']], True
+        elif 'texts' in request:
+            texts, single = request['texts'], False
+        else:
+            raise ValueError('Expected "text" or "texts".')
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            raise ValueError('"text" must be a string and "texts" a list of strings.')
+        features = request.get('features', FEATURES)
+        if not isinstance(features, list) or not features or not all(isinstance(feature, str) for feature in features):
+            raise ValueError('"features", if given, must be a non-empty list of structure names.')
+        unknown = [feature for feature in features if feature not in FEATURES]
+        if unknown:
+            raise ValueError(f'Unknown features {unknown}; expected some of {FEATURES}.')
+        return texts, single, [feature for feature in FEATURES if feature in features]
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+
+class _ServiceMixin:
+    # State shared by the TCP and Unix socket servers
+
+    def setup_service(self, batcher, model_name):
+        self.batcher = batcher
+        self.model_name = model_name
+        self.started = time.time()
+        self._counters = {'requests': 0, 'bad_requests': 0}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def metrics(self):
+        batcher = self.batcher.metrics
+        with self._lock:
+            metrics = dict(self._counters)
+        metrics.update({
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'queue_depth': self.batcher.queue_depth(),
+            'texts': batcher['texts'],
+            'batches': batcher['batches'],
+            'mean_batch_size': round(batcher['texts'] / batcher['batches'], 2) if batcher['batches'] else 0,
+            'rejected': batcher['rejected'],
+            'errors': batcher['errors'],
+            'parse_seconds': round(batcher['parse_seconds'], 4),
+            'mean_queue_wait_seconds': round(batcher['wait_seconds'] / batcher['texts'], 4) if batcher['texts'] else 0,
+        })
+        return metrics
+
+
+class AnalysisServer(_ServiceMixin, ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class UnixAnalysisServer(_ServiceMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def make_server(batcher, model_name, host='127.0.0.1', port=DEFAULT_PORT, socket_path=None):
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixAnalysisServer(socket_path, AnalysisHandler)
+    else:
+        server = AnalysisServer((host, port), AnalysisHandler)
+    server.setup_service(batcher, model_name)
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Serve NP complexity counts over HTTP/JSON with a warm pipeline.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: %(default)s)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on (default: %(default)s)')
+    parser.add_argument('--socket', help='listen on this Unix socket instead of a TCP port')
+    parser.add_argument('--model', default=MODEL_NAME, help=f'spaCy pipeline to load (default: {MODEL_NAME})')
+    parser.add_argument('--max-batch', type=int, default=DEFAULT_MAX_BATCH,
+                        help='most texts parsed together (default: %(default)s)')
+    parser.add_argument('--max-wait-ms', type=float, default=DEFAULT_MAX_WAIT * 1000,
+                        help='longest a text waits for its batch to fill, in ms (default: %(default)s)')
+    parser.add_argument('--max-queue', type=int, default=DEFAULT_MAX_QUEUE,
+                        help='waiting texts beyond which requests are refused with 503 (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='worker processes parsing the batches, forked from the loaded pipeline '
+                             '(default: %(default)s, parse in the server process)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    nlp = load_model(args.model)
+    pool = WorkerPool(args.workers, args.model) if args.workers > 1 else None
+    batcher = MicroBatcher(nlp, args.max_batch, args.max_wait_ms / 1000, args.max_queue, pool=pool)
+    server = make_server(batcher, args.model, args.host, args.port, args.socket)
+    where = args.socket or f'http://{args.host}:{server.server_address[1]}'
+    print(f'Serving {args.model} on {where}', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        if pool is not None:
+            pool.close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+############# NPC Analyzer: sharded runs ##############
+# Splits one large corpus across several nodes and merges the partial CSVs back.
+#   1. `manifest` lists the input files once (sorted by name, with their sizes), fixes the
+#      output columns and assigns every file to one of N shards, by a hash of its name or
+#      by size so that shards get similar amounts of text.
+#   2. Each node runs npca_cli.py with --manifest/--shard on its own copy or mount of the
+#      corpus; besides the partial CSV it writes <part>.meta.json recording the manifest,
+#      shard, columns, model and files of that part.
+#   3. `merge` checks that the parts belong together (same manifest, columns, model and
+#      spaCy version, every shard exactly once, no missing or duplicate files) and writes
+#      the rows in manifest order, so the result does not depend on which node ran what.
+# e.g.,
+#   python npca_shard.py manifest corpus/ -o corpus.manifest.json --shards 8 --by size
+#   python npca_cli.py /mnt/corpus -o part3.csv --manifest corpus.manifest.json --shard 3
+#   python npca_shard.py merge corpus.manifest.json part*.csv -o results.csv
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+
+import spacy
+
+from npca_engine import format_header, list_input_files
+
+META_SUFFIX = '.meta.json'
+PARTITIONS = ['hash', 'size']
+
+
+def _name_hash(name):
+    return int(hashlib.sha256(name.encode('utf-8')).hexdigest()[:16], 16)
+
+
+def partition(files, n_shards, by='hash'):
+    """
+    Shard index of every file in files ([{'name', 'size'}]), in the same order.
+
+    'hash' depends only on the file name, so a file keeps its shard when others
+    are added or removed. 'size' balances the bytes per shard: the largest files
+    are placed first, each on the shard with the fewest bytes so far.
+    """
+    if by == 'hash':
+        return [_name_hash(record['name']) % n_shards for record in files]
+    if by != 'size':
+        raise ValueError(f'Unknown partition "{by}", expected one of {PARTITIONS}.')
+
+    shards = [None] * len(files)
+    loads = [0] * n_shards
+    order = sorted(range(len(files)), key=lambda i: (-files[i]['size'], files[i]['name']))
+    for i in order:
+        shard = min(range(n_shards), key=lambda k: (loads[k], k))
+        shards[i] = shard
+        loads[shard] += files[i]['size']
+    return shards
+
+
+def manifest_id(manifest):
+    # Digest of everything that defines the sharded run
+    content = {key: manifest[key] for key in ('columns', 'shards', 'by', 'files')}
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def build_manifest(input_folder, selected_columns, n_shards, by='hash'):
+    if n_shards < 1:
+        raise ValueError('The number of shards must be at least 1.')
+    names = sorted(os.path.basename(file_name) for file_name in list_input_files(input_folder))
+    files = [{'name': name, 'size': os.path.getsize(os.path.join(input_folder, name))} for name in names]
+    for record, shard in zip(files, partition(files, n_shards, by)):
+        record['shard'] = shard
+    manifest = {'columns': list(selected_columns), 'shards': n_shards, 'by': by, 'files': files}
+    manifest['id'] = manifest_id(manifest)
+    return manifest
+
+
+def save_manifest(manifest, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=1)
+
+
+def load_manifest(path):
+    with open(path, encoding='utf-8') as file:
+        manifest = json.load(file)
+    if manifest.get('id') != manifest_id(manifest):
+        raise ValueError(f'Manifest "{path}" has been modified since it was created.')
+    return manifest
+
+
+def shard_files(manifest, shard, input_folder):
+    """
+    Paths under input_folder of the files of one shard, in manifest order.
+    Raises ValueError for a bad shard index or a file missing from input_folder.
+    """
+    if not 0 <= shard < manifest['shards']:
+        raise ValueError(f'Shard {shard} does not exist; the manifest has shards 0-{manifest["shards"] - 1}.')
+    file_list = [os.path.join(input_folder, record['name']) for record in manifest['files']
+                 if record['shard'] == shard]
+    missing = [file_name for file_name in file_list if not os.path.isfile(file_name)]
+    if missing:
+        raise ValueError(f'{len(missing)} files of shard {shard} are missing, e.g. "{missing[0]}".')
+    return file_list
+
+
+def meta_path_for(part_path):
+    return part_path + META_SUFFIX
+
+
+def write_shard_meta(part_path, manifest, shard, model):
+    meta = {
+        'manifest': manifest['id'],
+        'shard': shard,
+        'shards': manifest['shards'],
+        'columns': manifest['columns'],
+        'model': model,
+        'spacy': spacy.__version__,
+        'files': [record['name'] for record in manifest['files'] if record['shard'] == shard],
+    }
+    with open(meta_path_for(part_path), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, indent=1)
+
+
+def _read_part(part_path, columns):
+    # {file name: CSV row} of a partial CSV, checking its header and duplicate rows
+    rows = {}
+    with open(part_path, encoding='utf-8') as file:
+        if file.readline() != format_header(columns):
+            raise ValueError(f'"{part_path}" does not have the columns of the manifest.')
+        for row in file:
+            name = next(csv.reader([row]))[0]
+            if name in rows:
+                raise ValueError(f'"{part_path}" has more than one row for "{name}".')
+            rows[name] = row
+    return rows
+
+
+def merge_shards(manifest, part_paths, output_file_path):
+    """
+    Validate the partial CSVs of a sharded run and write them as one CSV in
+    manifest order. Raises ValueError if they do not add up to the manifest.
+    Returns the number of rows written.
+    """
+    metas = {}
+    reference = None
+    for part_path in part_paths:
+        with open(meta_path_for(part_path), encoding='utf-8') as file:
+            meta = json.load(file)
+        if meta['manifest'] != manifest['id']:
+            raise ValueError(f'"{part_path}" was produced from another manifest.')
+        if meta['shard'] in metas:
+            raise ValueError(f'Shard {meta["shard"]} is given twice: "{metas[meta["shard"]][0]}" and "{part_path}".')
+        signature = (meta['columns'], meta['model'], meta['spacy'])
+        if reference is None:
+            reference = (part_path, signature)
+        elif signature != reference[1]:
+            raise ValueError(f'"{part_path}" and "{reference[0]}" differ in columns, model or spaCy version.')
+        metas[meta['shard']] = (part_path, meta)
+
+    missing = [shard for shard in range(manifest['shards']) if shard not in metas]
+    if missing:
+        raise ValueError(f'Missing shards: {missing}.')
+
+    rows = {}
+    for shard, (part_path, meta) in sorted(metas.items()):
+        part_rows = _read_part(part_path, manifest['columns'])
+        expected = [record['name'] for record in manifest['files'] if record['shard'] == shard]
+        if set(part_rows) != set(expected):
+            absent = sorted(set(expected) - set(part_rows))
+            extra = sorted(set(part_rows) - set(expected))
+            raise ValueError(f'"{part_path}" does not hold the files of shard {shard} '
+                             f'(missing: {absent[:5]}, unexpected: {extra[:5]}).')
+        rows.update(part_rows)
+
+    tmp_path = output_file_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as out_file:
+        out_file.write(format_header(manifest['columns']))
+        for record in manifest['files']:
+            out_file.write(rows[record['name']])
+    os.replace(tmp_path, output_file_path)
+    return len(manifest['files'])
+
+
+def build_parser():
+    # Imported here: npca_cli imports this module for its --manifest option
+    from npca_cli import add_column_arguments
+
+    parser = argparse.ArgumentParser(description='Create the manifest of a sharded run, or merge its partial CSVs.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('manifest', help='list the input files and assign them to shards')
+    create.add_argument('input_folder', help='folder containing the text files to analyze')
+    create.add_argument('-o', '--output', required=True, help='path of the manifest JSON to write')
+    create.add_argument('--shards', type=int, required=True, help='number of shards')
+    create.add_argument('--by', choices=PARTITIONS, default='hash',
+                        help='assign files by a hash of their name or balance them by size (default: hash)')
+    add_column_arguments(create)
+
+    merge = commands.add_parser('merge', help='validate the partial CSVs and combine them in manifest order')
+    merge.add_argument('manifest', help='manifest JSON of the run')
+    merge.add_argument('parts', nargs='+', help='partial CSVs, one per shard')
+    merge.add_argument('-o', '--output', required=True, help='path of the merged CSV to write')
+    return parser
+
+
+def main(argv=None):
+    from npca_cli import columns_from_args
+
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command == 'manifest':
+            if not os.path.isdir(args.input_folder):
+                print(f'Error: input folder "{args.input_folder}" not found.', file=sys.stderr)
+                return 2
+            manifest = build_manifest(args.input_folder, columns_from_args(args), args.shards, args.by)
+            save_manifest(manifest, args.output)
+            sizes = [0] * args.shards
+            for record in manifest['files']:
+                sizes[record['shard']] += 1
+            print(f'{len(manifest["files"])} files in {args.shards} shards ({", ".join(map(str, sizes))} files).',
+                  file=sys.stderr)
+        else:
+            total = merge_shards(load_manifest(args.manifest), args.parts, args.output)
+            print(f'CSV file "{args.output}" merged from {len(args.parts)} shards, {total} files.', file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
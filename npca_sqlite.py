@@ -0,0 +1,218 @@
+############# NPC Analyzer: SQLite results store ##############
+# Optional second output of a corpus run, next to the CSV: an indexed SQLite database that can
+# be queried without reprocessing the corpus or loading it into pandas.
+#   runs     one row per run: input, output CSV, model, columns, start and end time
+#   files    one row per analyzed file (or corpus record): run, name as in the CSV, word count
+#   counts   raw and normed frequency of every counted structure of every file
+#   matches  every match (as in npca_export), when the run stores them
+# Rows are inserted in batches, one transaction per batch, with the database in WAL mode so
+# that it can be queried while a run is still writing to it. One run writes at a time.
+# e.g.,
+#   python npca_cli.py corpus/ -o results.csv --db results.db --db-matches
+#   python npca_sqlite.py results.db files ml --min 6
+#   python npca_sqlite.py results.db heads comp --limit 20
+#   python npca_sqlite.py results.db means
+
+import argparse
+import json
+import sqlite3
+import sys
+import time
+
+# Files whose rows are buffered before they are inserted in one transaction
+DEFAULT_DB_BATCH = 500
+# Buffered matches that trigger an early insert, whatever the number of files
+_MAX_PENDING_MATCHES = 50000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    input TEXT NOT NULL,
+    output TEXT NOT NULL,
+    model TEXT,
+    columns TEXT NOT NULL,
+    started TEXT NOT NULL,
+    finished TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    words INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counts (
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    feature TEXT NOT NULL,
+    raw INTEGER NOT NULL,
+    normed REAL NOT NULL,
+    PRIMARY KEY (file_id, feature)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS matches (
+    file_id INTEGER NOT NULL REFERENCES files (id),
+    feature TEXT NOT NULL,
+    sentence INTEGER,
+    start_char INTEGER NOT NULL,
+    end_char INTEGER NOT NULL,
+    head_lemma TEXT,
+    phrase TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_run_name ON files (run_id, name);
+CREATE INDEX IF NOT EXISTS counts_feature_raw ON counts (feature, raw);
+CREATE INDEX IF NOT EXISTS matches_file ON matches (file_id);
+CREATE INDEX IF NOT EXISTS matches_feature_lemma ON matches (feature, head_lemma);
+CREATE INDEX IF NOT EXISTS matches_lemma ON matches (head_lemma);
+"""
+
+
+def _now():
+    return time.strftime('%Y-%m-%dT%H:%M:%S%z')
+
+
+class ResultStore:
+    """
+    Writes the rows of corpus runs to a SQLite database, creating it if needed.
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_DB_BATCH):
+        self.path = path
+        self.batch_size = batch_size
+        # The corpus loop may write from its writer thread (see run_corpus's write_behind)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._next_file_id = self._db.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM files').fetchone()[0]
+        self._files = []
+        self._counts = []
+        self._matches = []
+
+    def start_run(self, input_path, output_path, model, columns):
+        """
+        Record a new run and return its id.
+        """
+        with self._db:
+            cursor = self._db.execute('INSERT INTO runs (input, output, model, columns, started) VALUES (?, ?, ?, ?, ?)',
+                                      (input_path, output_path, model, json.dumps(columns), _now()))
+        return cursor.lastrowid
+
+    def add_file(self, run_id, name, word_count, results, matches=None):
+        """
+        Buffer the row of one file: its results ({<feature>_raw/_normed: value})
+        and, optionally, its match records (see npca_matches.match_records).
+        """
+        file_id = self._next_file_id
+        self._next_file_id += 1
+        self._files.append((file_id, run_id, name, word_count))
+        for column, value in results.items():
+            if column.endswith('_raw'):
+                feature = column[:-len('_raw')]
+                self._counts.append((file_id, feature, value, results[f'{feature}_normed']))
+        if matches:
+            self._matches.extend((file_id,) + tuple(match) for match in matches)
+        if len(self._files) >= self.batch_size or len(self._matches) >= _MAX_PENDING_MATCHES:
+            self.flush()
+
+    def flush(self):
+        if not self._files:
+            return
+        with self._db:
+            self._db.executemany('INSERT INTO files (id, run_id, name, words) VALUES (?, ?, ?, ?)', self._files)
+            self._db.executemany('INSERT INTO counts (file_id, feature, raw, normed) VALUES (?, ?, ?, ?)',
+                                 self._counts)
+            self._db.executemany('INSERT INTO matches (file_id, feature, sentence, start_char, end_char, head_lemma, '
+                                 'phrase) VALUES (?, ?, ?, ?, ?, ?, ?)', self._matches)
+        self._files = []
+        self._counts = []
+        self._matches = []
+
+    def finish_run(self, run_id):
+        self.flush()
+        with self._db:
+            self._db.execute('UPDATE runs SET finished = ? WHERE id = ?', (_now(), run_id))
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._db.close()
+
+
+def _latest_run(db, run_id):
+    if run_id is not None:
+        return run_id
+    row = db.execute('SELECT MAX(id) FROM runs').fetchone()
+    if row[0] is None:
+        raise ValueError('The database holds no runs.')
+    return row[0]
+
+
+def files_with_more_than(db, feature, minimum, run_id=None):
+    """
+    [(file name, raw count)] of the files of a run (the latest by default)
+    with at least minimum instances of feature, most first.
+    """
+    return db.execute('SELECT files.name, counts.raw FROM counts JOIN files ON files.id = counts.file_id '
+                      'WHERE counts.feature = ? AND counts.raw >= ? AND files.run_id = ? '
+                      'ORDER BY counts.raw DESC, files.name',
+                      (feature, minimum, _latest_run(db, run_id))).fetchall()
+
+
+def top_heads(db, feature, limit=20, run_id=None):
+    """
+    [(head lemma, matches)] of the most frequent head nouns of feature in a run.
+    Needs a run that stored its matches.
+    """
+    return db.execute('SELECT matches.head_lemma, COUNT(*) AS n FROM matches JOIN files ON files.id = matches.file_id '
+                      'WHERE matches.feature = ? AND files.run_id = ? '
+                      'GROUP BY matches.head_lemma ORDER BY n DESC, matches.head_lemma LIMIT ?',
+                      (feature, _latest_run(db, run_id), limit)).fetchall()
+
+
+def feature_means(db, run_id=None):
+    """
+    {feature: mean normed frequency} over the files of a run, highest first.
+    """
+    rows = db.execute('SELECT counts.feature, AVG(counts.normed) AS mean FROM counts '
+                      'JOIN files ON files.id = counts.file_id WHERE files.run_id = ? '
+                      'GROUP BY counts.feature ORDER BY mean DESC', (_latest_run(db, run_id),)).fetchall()
+    return dict(rows)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Query the SQLite results of NPC analyzer runs.')
+    parser.add_argument('database', help='SQLite file written with npca_cli.py --db')
+    parser.add_argument('--run', type=int, help='run id (default: the latest run)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    files = commands.add_parser('files', help='files with at least --min instances of a structure')
+    files.add_argument('feature', help='structure prefix, e.g. ml')
+    files.add_argument('--min', type=int, default=1, help='least raw count (default: %(default)s)')
+
+    heads = commands.add_parser('heads', help='most frequent head lemmas of a structure (needs --db-matches)')
+    heads.add_argument('feature', help='structure prefix, e.g. comp')
+    heads.add_argument('--limit', type=int, default=20, help='heads to list (default: %(default)s)')
+
+    commands.add_parser('means', help='mean normed frequency of every structure')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        db = sqlite3.connect(f'file:{args.database}?mode=ro', uri=True)
+        if args.command == 'files':
+            rows = files_with_more_than(db, args.feature, args.min, args.run)
+        elif args.command == 'heads':
+            rows = top_heads(db, args.feature, args.limit, args.run)
+        else:
+            rows = feature_means(db, args.run).items()
+    except (sqlite3.Error, ValueError) as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    for row in rows:
+        print('\t'.join(str(value) for value in row))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+############# NPC Analyzer: streaming reads ##############
+# Splits very large input files into bounded chunks so they can be parsed piece by piece
+# instead of as one Doc (spaCy refuses texts longer than nlp.max_length, and a book-length
+# Doc plus its phrase lists does not fit in memory on small nodes).
+# Files are read line by line, and chunks are cut at paragraph breaks where possible, then
+# after sentence-final punctuation, then at any whitespace; never at a bare line break, which
+# in hard-wrapped text falls mid-sentence. Since these cuts fall on whitespace, the word
+# counts (text.split()) of the chunks add up to the word count of the whole file. Only a
+# run of more than chunk_size characters without whitespace is cut inside, at chunk_size
+# characters (a chunk must stay parseable), and its two parts count as two words. The
+# structure counts add up to the unchunked counts as long as no sentence spans a cut, which
+# is what cutting at paragraph and sentence boundaries aims for.
+# By default the engine only chunks texts longer than the model's nlp.max_length (1,000,000
+# characters for spaCy pipelines), which could not be parsed whole anyway; other texts give
+# exactly the unchunked counts.
+
+import re
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _last_cut(pattern, text, start, end):
+    cut = None
+    for match in pattern.finditer(text, start, end):
+        if match.end() > start:
+            cut = match.end()
+    return cut
+
+
+def split_long_text(text, chunk_size):
+    """
+    Split a text longer than chunk_size after sentence-final punctuation,
+    falling back to whitespace. A window of chunk_size characters without
+    whitespace is cut at its end, inside the word or token that crosses it,
+    so no piece is ever longer than chunk_size.
+    """
+    pieces = []
+    start = 0
+    while len(text) - start > chunk_size:
+        end = start + chunk_size
+        cut = _last_cut(_SENTENCE_END, text, start, end) or _last_cut(_WHITESPACE, text, start, end) or end
+        pieces.append(text[start:cut])
+        start = cut
+    pieces.append(text[start:])
+    return pieces
+
+
+def iter_paragraphs(lines, chunk_size):
+    """
+    Group lines into paragraphs, each ending with the blank lines that follow it.
+    A paragraph that grows past twice chunk_size is split as split_long_text()
+    would split it whole, and all its pieces but the last are handed out early,
+    so that a file without blank lines is never held in memory at once.
+    """
+    paragraph = []
+    length = 0
+    seen_blank = False
+    for line in lines:
+        blank = not line.strip()
+        if paragraph and seen_blank and not blank:
+            yield ''.join(paragraph)
+            paragraph = []
+            length = 0
+            seen_blank = False
+        paragraph.append(line)
+        length += len(line)
+        seen_blank = seen_blank or (blank and length > len(line))
+        if length > 2 * chunk_size:
+            # Every cut but the last has its whole window in the buffer, so it is the cut
+            # split_long_text() makes on the complete paragraph
+            *pieces, rest = split_long_text(''.join(paragraph), chunk_size)
+            yield from pieces
+            paragraph = [rest]
+            length = len(rest)
+    if paragraph:
+        yield ''.join(paragraph)
+
+
+def iter_text_chunks(lines, chunk_size):
+    """
+    Pack paragraphs from an iterable of lines into chunks of at most chunk_size
+    characters (a run of characters without whitespace that is longer is cut
+    inside, see split_long_text()).
+    Always yields at least one chunk, which is empty for empty input.
+    """
+    chunk = []
+    length = 0
+    produced = False
+    for paragraph in iter_paragraphs(lines, chunk_size):
+        pieces = split_long_text(paragraph, chunk_size) if len(paragraph) > chunk_size else [paragraph]
+        for piece in pieces:
+            if chunk and length + len(piece) > chunk_size:
+                yield ''.join(chunk)
+                produced = True
+                chunk = []
+                length = 0
+            chunk.append(piece)
+            length += len(piece)
+    if chunk or not produced:
+        yield ''.join(chunk)
+
+
+def iter_file_chunks(file_name, chunk_size):
+    with open(file_name, encoding='utf-8', errors='ignore') as file:
+        yield from iter_text_chunks(file, chunk_size)
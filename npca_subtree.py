@@ -0,0 +1,131 @@
+############# NPC Analyzer: subtree span index ##############
+# The clause checks behind rc and comp look for finite verbs, relativizers or to-aux in the
+# subtree of a dependent. Walking list(token.subtree) for every candidate re-walks the same
+# tokens again and again under nested nouns, which is quadratic on long, deeply embedded
+# sentences. SubtreeIndex is built once per Doc: it holds the [first, last] token span
+# of every token and prefix sums of each flag, so "does this subtree contain a finite
+# verb?" is two array lookups. A subtree is only answered from its span when the span holds
+# exactly the subtree (always true for projective parses); otherwise the token walk is used.
+
+import numpy
+from spacy.attrs import DEP, HEAD, LOWER, POS, TAG
+
+from npca_features import NONFINITE_TAGS, RELATIVIZERS, comp_clause, rc_clause
+
+# Column order of the attribute array SubtreeIndex reads (the same as npca_vector's)
+COLUMNS = [POS, TAG, DEP, HEAD, LOWER]
+
+_WH_RELATIVIZERS = {"who", "which", "whom", "whose"}
+
+
+def _prefix_sum(flags):
+    prefix = numpy.zeros(len(flags) + 1, dtype=numpy.int64)
+    numpy.cumsum(flags, out=prefix[1:])
+    return prefix
+
+
+class SubtreeIndex:
+    """
+    Per-Doc span index answering flag queries over token subtrees in O(1).
+    array, if given, is doc.to_array(COLUMNS) already computed by the caller.
+    """
+
+    def __init__(self, doc, array=None):
+        n = len(doc)
+        strings = doc.vocab.strings
+        if array is None:
+            array = doc.to_array(COLUMNS)
+        pos, tag, dep, lower = array[:, 0], array[:, 1], array[:, 2], array[:, 4]
+        index = numpy.arange(n)
+        head = index + array[:, 3].astype(numpy.int64)
+
+        self.left, self.right, sizes = self._subtree_spans(head.tolist())
+        self.contiguous = self.right - self.left + 1 == sizes
+
+        finite = numpy.isin(pos, [strings['VERB'], strings['AUX']]) & ~numpy.isin(
+            tag, [strings[value] for value in NONFINITE_TAGS])
+        self._prefix = {
+            'finite': _prefix_sum(finite),
+            'relativizer': _prefix_sum(numpy.isin(lower, [strings[value] for value in RELATIVIZERS])),
+            'wh_relativizer': _prefix_sum(numpy.isin(lower, [strings[value] for value in _WH_RELATIVIZERS])),
+            'to_aux': _prefix_sum((lower == strings['to']) & (dep == strings['aux'])),
+        }
+
+    @staticmethod
+    def _subtree_spans(head):
+        # First token, last token and size of each token's subtree, summed from the leaves up.
+        # (Token.left_edge / right_edge are not reliable on non-projective parses.)
+        n = len(head)
+        children = [[] for _ in range(n)]
+        order = []
+        for i, h in enumerate(head):
+            if h == i:
+                order.append(i)
+            else:
+                children[h].append(i)
+        # Top-down order of every token; reversed, each token comes before its head
+        for k in order:
+            order.extend(children[k])
+        left = list(range(n))
+        right = list(range(n))
+        sizes = [1] * n
+        for k in reversed(order):
+            h = head[k]
+            if h != k:
+                sizes[h] += sizes[k]
+                left[h] = min(left[h], left[k])
+                right[h] = max(right[h], right[k])
+        return (numpy.array(left, dtype=numpy.int64), numpy.array(right, dtype=numpy.int64),
+                numpy.array(sizes, dtype=numpy.int64))
+
+    def has(self, flag, i):
+        """
+        True if the subtree of token i contains a token with the flag, None if the
+        subtree is not a contiguous span (the caller has to walk it).
+        """
+        if not self.contiguous[i]:
+            return None
+        prefix = self._prefix[flag]
+        return bool(prefix[self.right[i] + 1] - prefix[self.left[i]])
+
+
+def is_rc(index, head, child):
+    """
+    rc_clause(head, child) is not None, answered from the span index where possible.
+    """
+    lower = child.lower_
+    if lower in RELATIVIZERS:
+        # [child] + subtree of child: child is part of its own subtree
+        finite = index.has('finite', child.i)
+        if finite is not None:
+            return finite
+    elif child.dep_ in {"acl", "relcl"}:
+        relativizer = index.has('relativizer', child.i)
+        if relativizer is not None:
+            return relativizer and index.has('finite', child.i)
+    else:
+        return False
+    return rc_clause(head, child) is not None
+
+
+def is_comp(index, head, child):
+    """
+    comp_clause(head, child) is not None, answered from the span index where possible.
+    """
+    if child.lower_ == "that" and child.pos_ == "SCONJ" and child.dep_ == "mark":
+        clause_head = child.head
+        if clause_head.i <= head.i:
+            return False
+        relativizer = index.has('wh_relativizer', clause_head.i)
+        if relativizer is not None:
+            return index.has('finite', clause_head.i) and not relativizer
+    elif child.dep_ == "acl" and child.tag_ == "VB":
+        to_aux = index.has('to_aux', child.i)
+        if to_aux is not None:
+            return to_aux
+    elif child.dep_ == "acl" and child.pos_ == "VERB":
+        # The tag check makes this branch unreachable after the one above, as in comp_clause
+        return False
+    else:
+        return False
+    return comp_clause(head, child) is not None
@@ -0,0 +1,159 @@
+############# NPC Analyzer: vectorized counting ##############
+# NumPy version of count_all for the structures that are local dependency patterns.
+# The Doc is exported once as a token x attribute matrix (doc.to_array) and adj, nm, poss,
+# of, prep, nonf, adj_nm and ml are counted with boolean masks over its columns and
+# gathers through the head index, instead of Python loops over Token objects.
+# rc and comp need to look into the subtree of a clause; they are checked only on the few
+# dependents that can start a clause, with span queries on a SubtreeIndex (npca_subtree).
+
+import time
+
+import numpy
+
+from npca_features import EXTRACTORS, FEATURES, RELATIVIZERS
+from npca_subtree import COLUMNS, SubtreeIndex, is_comp, is_rc
+
+
+def _ids(strings, values):
+    return [strings[value] for value in values]
+
+
+# Key under which count_all_vectorized records the time of the setup its counting steps share
+SHARED = 'shared'
+
+
+class _DocArrays:
+    # The Doc exported as a token x attribute matrix, and the masks that several structures share
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.strings = strings = doc.vocab.strings
+        self.array = array = doc.to_array(COLUMNS)
+        self.pos, self.tag, self.dep, self.lower = array[:, 0], array[:, 1], array[:, 2], array[:, 4]
+        # HEAD is stored as an unsigned offset to the head; the root points at itself
+        n = len(doc)
+        self.index = index = numpy.arange(n)
+        self.head = head = index + array[:, 3].astype(numpy.int64)
+
+        nominal = numpy.isin(self.pos, _ids(strings, ['NOUN', 'PRON']))
+        # Dependents (not the root) of a nominal head, on its left and on its right side
+        self.child = child = (head != index) & nominal[head]
+        self.left = child & (index < head)
+        self.right = child & (index > head)
+
+        self.is_prep = self.dep == strings['prep']
+        self.is_of = self.lower == strings['of']
+        self.adj = self.left & (self.dep == strings['amod']) & (self.pos == strings['ADJ'])
+        self.nm = self.left & (self.dep == strings['compound']) & (self.pos == strings['NOUN'])
+        self._subtrees = None
+
+    def heads_of(self, mask):
+        # Tokens that are the head of at least one token of mask
+        found = numpy.zeros(len(self.index), dtype=bool)
+        found[self.head[mask]] = True
+        return found
+
+    def subtrees(self):
+        # Built on first use: only rc and comp candidates need it, and most sentences have none
+        if self._subtrees is None:
+            self._subtrees = SubtreeIndex(self.doc, self.array)
+        return self._subtrees
+
+
+def _count_poss(a):
+    return int((a.left & (a.dep == a.strings['poss'])).sum())
+
+
+def _count_nonf(a):
+    return int((a.child & (a.dep == a.strings['acl']) & numpy.isin(a.tag, _ids(a.strings, ['VBG', 'VBN']))).sum())
+
+
+def _count_adj_nm(a):
+    # Heads with at least one adjective and one noun premodifier
+    return int((a.heads_of(a.adj) & a.heads_of(a.nm)).sum())
+
+
+def _count_ml(a):
+    # PP dependents of a nominal head whose object (pobj) has a PP dependent of its own
+    not_root = a.head != a.index
+    pobj = not_root & (a.dep == a.strings['pobj']) & a.heads_of(a.is_prep & not_root)
+    return int((a.child & a.is_prep & a.heads_of(pobj)).sum())
+
+
+def _count_clauses(a, candidates, is_clause):
+    # Right dependents of nominal heads that could start the clause, checked on their subtree
+    found = numpy.flatnonzero(a.right & candidates).tolist()
+    count = 0
+    for i in found:
+        token = a.doc[i]
+        if is_clause(a.subtrees(), token.head, token):
+            count += 1
+    return count
+
+
+def _count_rc(a):
+    acl = numpy.isin(a.dep, _ids(a.strings, ['acl', 'relcl']))
+    return _count_clauses(a, numpy.isin(a.lower, _ids(a.strings, RELATIVIZERS)) | acl, is_rc)
+
+
+def _count_comp(a):
+    that = (a.lower == a.strings['that']) & (a.pos == a.strings['SCONJ']) & (a.dep == a.strings['mark'])
+    return _count_clauses(a, that | (a.dep == a.strings['acl']), is_comp)
+
+
+_STEPS = {
+    'adj': lambda a: int(a.adj.sum()),
+    'nm': lambda a: int(a.nm.sum()),
+    'poss': _count_poss,
+    'of': lambda a: int((a.child & a.is_prep & a.is_of).sum()),
+    'prep': lambda a: int((a.child & a.is_prep & ~a.is_of).sum()),
+    'nonf': _count_nonf,
+    'adj_nm': _count_adj_nm,
+    'ml': _count_ml,
+    'rc': _count_rc,
+    'comp': _count_comp,
+}
+
+
+def count_all_vectorized(doc, features=None, timings=None):
+    """
+    Same result as npca_features.count_all(doc, features), computed on arrays:
+    {feature: count} for the requested features (all ten by default).
+    If timings ({key: seconds}) is given, the time of each structure's own counting
+    step is added to timings[feature], and that of the setup they share
+    (doc.to_array and the common masks) to timings[SHARED].
+    """
+    wanted = set(FEATURES) if features is None else set(features)
+    features = [feature for feature in FEATURES if feature in wanted]
+    if len(doc) == 0:
+        return {feature: 0 for feature in features}
+    if timings is None:
+        arrays = _DocArrays(doc)
+        return {feature: _STEPS[feature](arrays) for feature in features}
+
+    start = time.perf_counter()
+    arrays = _DocArrays(doc)
+    timings[SHARED] += time.perf_counter() - start
+    counts = {}
+    for feature in features:
+        start = time.perf_counter()
+        counts[feature] = _STEPS[feature](arrays)
+        timings[feature] += time.perf_counter() - start
+    return counts
+
+
+def cross_check(docs, features=None, counter=count_all_vectorized):
+    """
+    Compare counter(doc, features) (count_all_vectorized by default) with len()
+    of every count_* list on each Doc.
+    Returns a list of (doc_index, feature, expected, got) for each disagreement.
+    """
+    features = FEATURES if features is None else features
+    mismatches = []
+    for i, doc in enumerate(docs):
+        got = counter(doc, features)
+        for feature in features:
+            expected = len(EXTRACTORS[feature](doc))
+            if got[feature] != expected:
+                mismatches.append((i, feature, expected, got[feature]))
+    return mismatches
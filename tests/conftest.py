@@ -0,0 +1,96 @@
+# Shared fixtures. No spaCy model is needed: Docs are built by hand, and corpus runs use a
+# blank English pipeline with a stub parser that gives every sentence a fixed pseudo parse.
+
+import os
+import random
+import sys
+import zlib
+
+import pytest
+import spacy
+from spacy.language import Language
+from spacy.tokens import Doc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TAGS = {'NN': 'NOUN', 'NNS': 'NOUN', 'JJ': 'ADJ', 'IN': 'ADP', 'DT': 'DET', 'VBZ': 'VERB', 'VBD': 'VERB',
+        'VBG': 'VERB', 'VBN': 'VERB', 'VB': 'VERB', 'TO': 'PART', 'WDT': 'PRON', 'PRP': 'PRON', 'MD': 'AUX'}
+DEPS = ['amod', 'compound', 'prep', 'pobj', 'acl', 'relcl', 'aux', 'mark', 'poss', 'nsubj', 'dobj', 'det']
+WORDS = ('of of to to that the man who which whom whose in on house fact idea win studies method used '
+         'written nice red school teacher report chair committee').split()
+
+
+def random_parse(rng, n):
+    # Projective tree over n tokens, with random labels
+    heads = [0] * n
+
+    def build(left, right, head):
+        if left > right:
+            return
+        middle = rng.randint(left, right)
+        heads[middle] = middle if head is None else head
+        build(left, middle - 1, middle)
+        build(middle + 1, right, middle)
+
+    build(0, n - 1, None)
+    deps = ['ROOT' if heads[i] == i else rng.choice(DEPS) for i in range(n)]
+    tags = [rng.choice(list(TAGS) + ['NN', 'NN', 'JJ', 'VB', 'IN']) for _ in range(n)]
+    pos = [TAGS[tag] if rng.random() < 0.8 else rng.choice(['SCONJ', 'AUX', 'NOUN', 'PRON']) for tag in tags]
+    return heads, deps, tags, pos
+
+
+def random_doc(vocab, rng, n_sents=3):
+    words, heads, deps, tags, pos = [], [], [], [], []
+    for _ in range(n_sents):
+        n = rng.randint(3, 25)
+        sent_heads, sent_deps, sent_tags, sent_pos = random_parse(rng, n)
+        heads += [head + len(words) for head in sent_heads]
+        words += [rng.choice(WORDS) for _ in range(n)]
+        deps += sent_deps
+        tags += sent_tags
+        pos += sent_pos
+    return Doc(vocab, words=words, heads=heads, deps=deps, tags=tags, pos=pos)
+
+
+@Language.component('npca_test_parser')
+def stub_parser(doc):
+    # Every sentence (split at '.') gets the pseudo parse seeded by its text
+    heads, deps, tags, pos = [], [], [], []
+    start = 0
+    for i, token in enumerate(doc):
+        if token.text == '.' or i == len(doc) - 1:
+            seed = zlib.crc32(' '.join(t.text for t in doc[start:i + 1]).encode('utf-8'))
+            sent_heads, sent_deps, sent_tags, sent_pos = random_parse(random.Random(seed), i + 1 - start)
+            heads += [head + start for head in sent_heads]
+            deps += sent_deps
+            tags += sent_tags
+            pos += sent_pos
+            start = i + 1
+    parsed = Doc(doc.vocab, words=[t.text for t in doc], spaces=[bool(t.whitespace_) for t in doc], heads=heads,
+                 deps=deps, tags=tags, pos=pos)
+    # nlp.pipe(as_tuples=True) finds the context of a text on its Doc
+    parsed._context = doc._context
+    return parsed
+
+
+@pytest.fixture
+def nlp():
+    nlp = spacy.blank('en')
+    nlp.add_pipe('npca_test_parser', name='parser')
+    return nlp
+
+
+def write_corpus(folder, n_files=8, seed=1):
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    for i in range(n_files):
+        sentences = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))) + ' .'
+                     for _ in range(rng.randint(2, 8))]
+        with open(os.path.join(folder, f'text{i:02d}.txt'), 'w', encoding='utf-8') as file:
+            file.write(' '.join(sentences) + '\n')
+    return folder
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    return write_corpus(str(tmp_path / 'corpus'))
@@ -0,0 +1,114 @@
+import os
+
+import pytest
+
+from npca_checkpoint import Checkpoint, checkpoint_path_for
+from npca_engine import run_corpus, select_columns
+from npca_features import FEATURES
+
+COLUMNS = select_columns(FEATURES)
+
+
+def rows_by_file(path):
+    with open(path, encoding='utf-8') as file:
+        lines = file.readlines()
+    return lines[0], {line.split(',', 1)[0]: line for line in lines[1:]}
+
+
+def stop_after(n):
+    calls = [0]
+
+    def should_stop():
+        calls[0] += 1
+        return calls[0] > n
+    return should_stop
+
+
+@pytest.fixture
+def reference(nlp, corpus, tmp_path):
+    path = str(tmp_path / 'reference.csv')
+    run_corpus(corpus, path, COLUMNS, nlp=nlp)
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+
+def partial_run(nlp, corpus, output, n):
+    run_corpus(corpus, output, COLUMNS, nlp=nlp, checkpoint_path=checkpoint_path_for(output),
+               should_stop=stop_after(n))
+
+
+def resume(nlp, corpus, output, columns=COLUMNS):
+    return run_corpus(corpus, output, columns, nlp=nlp, checkpoint_path=checkpoint_path_for(output), resume=True)
+
+
+def test_resume_after_partial_run(nlp, corpus, tmp_path, reference):
+    output = str(tmp_path / 'out.csv')
+    partial_run(nlp, corpus, output, 3)
+    assert len(Checkpoint(checkpoint_path_for(output)).load().completed) == 3
+    assert resume(nlp, corpus, output) == 8
+    with open(output, encoding='utf-8') as file:
+        assert file.read() == reference
+
+
+def test_resume_cuts_unrecorded_row_and_torn_manifest_line(nlp, corpus, tmp_path, reference):
+    output = str(tmp_path / 'out.csv')
+    partial_run(nlp, corpus, output, 3)
+    # The run died while writing a row and its manifest line
+    with open(output, 'a', encoding='utf-8') as file:
+        file.write('text03.txt,12,0.0')
+    with open(checkpoint_path_for(output), 'a', encoding='utf-8') as file:
+        file.write('{"path": "/x", "si')
+    resume(nlp, corpus, output)
+    with open(output, encoding='utf-8') as file:
+        assert file.read() == reference
+
+
+def test_resume_redoes_rows_missing_from_csv(nlp, corpus, tmp_path, reference):
+    # A machine crash can leave manifest lines for rows the CSV on disk lacks
+    output = str(tmp_path / 'out.csv')
+    partial_run(nlp, corpus, output, 4)
+    checkpoint = Checkpoint(checkpoint_path_for(output)).load()
+    second_row_end = list(checkpoint.completed.values())[1]['csv_length']
+    with open(output, 'r+b') as file:
+        file.truncate(second_row_end + 5)
+    resume(nlp, corpus, output)
+    with open(output, encoding='utf-8') as file:
+        assert file.read() == reference
+
+
+def test_resume_reanalyzes_changed_file(nlp, corpus, tmp_path, reference):
+    output = str(tmp_path / 'out.csv')
+    partial_run(nlp, corpus, output, 4)
+    order = [line.split(',', 1)[0] for line in reference.splitlines()[1:]]
+    changed = order[1]
+    with open(os.path.join(corpus, changed), 'a', encoding='utf-8') as file:
+        file.write('the fact that the man won on the house of the committee .\n')
+    os.utime(os.path.join(corpus, changed), (1, 1))
+    resume(nlp, corpus, output)
+
+    fresh = str(tmp_path / 'fresh.csv')
+    run_corpus(corpus, fresh, COLUMNS, nlp=nlp)
+    header, rows = rows_by_file(output)
+    assert (header, rows) == rows_by_file(fresh)
+    # The changed file's stale row was dropped; it is analyzed again with the files not done yet
+    assert list(rows) == order[:1] + order[2:4] + order[1:2] + order[4:]
+
+
+def test_resume_drops_deleted_file(nlp, corpus, tmp_path):
+    output = str(tmp_path / 'out.csv')
+    partial_run(nlp, corpus, output, 4)
+    os.remove(os.path.join(corpus, 'text02.txt'))
+    assert resume(nlp, corpus, output) == 7
+
+    fresh = str(tmp_path / 'fresh.csv')
+    run_corpus(corpus, fresh, COLUMNS, nlp=nlp)
+    assert rows_by_file(output) == rows_by_file(fresh)
+    completed = Checkpoint(checkpoint_path_for(output)).load().completed
+    assert os.path.abspath(os.path.join(corpus, 'text02.txt')) not in completed
+
+
+def test_resume_refuses_other_columns(nlp, corpus, tmp_path):
+    output = str(tmp_path / 'out.csv')
+    partial_run(nlp, corpus, output, 2)
+    with pytest.raises(ValueError, match='columns'):
+        resume(nlp, corpus, output, select_columns(['of']))
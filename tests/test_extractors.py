@@ -0,0 +1,71 @@
+import random
+
+import pytest
+import spacy
+from spacy.tokens import Doc
+
+from conftest import random_doc
+from npca_features import EXTRACTORS, FEATURES, count_all, extract_all
+from npca_matches import MatchStore
+from npca_rules import RuleSet
+from npca_vector import count_all_vectorized
+
+VOCAB = spacy.blank('en').vocab
+
+
+def hand_built_docs():
+    # One Doc per structure family, so that every extractor has something to find
+    yield Doc(VOCAB, words=['large', 'school', 'report', 'to', 'win', '.'], heads=[2, 2, 2, 4, 2, 2],
+              deps=['amod', 'compound', 'ROOT', 'aux', 'acl', 'punct'], tags=['JJ', 'NN', 'NN', 'TO', 'VB', '.'],
+              pos=['ADJ', 'NOUN', 'NOUN', 'PART', 'VERB', 'PUNCT'])
+    yield Doc(VOCAB, words=['chair', 'of', 'committee', 'in', 'house', '.'], heads=[0, 0, 1, 2, 3, 0],
+              deps=['ROOT', 'prep', 'pobj', 'prep', 'pobj', 'punct'], tags=['NN', 'IN', 'NN', 'IN', 'NN', '.'],
+              pos=['NOUN', 'ADP', 'NOUN', 'ADP', 'NOUN', 'PUNCT'])
+    yield Doc(VOCAB, words=['Mary', "'s", 'man', 'who', 'left', 'studies', 'written', 'by', 'her'],
+              heads=[2, 0, 2, 4, 2, 2, 5, 6, 7],
+              deps=['poss', 'case', 'ROOT', 'nsubj', 'relcl', 'conj', 'acl', 'agent', 'pobj'],
+              tags=['NNP', 'POS', 'NN', 'WP', 'VBD', 'NNS', 'VBN', 'IN', 'PRP'],
+              pos=['PROPN', 'PART', 'NOUN', 'PRON', 'VERB', 'NOUN', 'VERB', 'ADP', 'PRON'])
+    yield Doc(VOCAB, words=['the', 'fact', 'that', 'he', 'left'], heads=[1, 1, 4, 4, 1],
+              deps=['det', 'ROOT', 'mark', 'nsubj', 'acl'], tags=['DT', 'NN', 'IN', 'PRP', 'VBD'],
+              pos=['DET', 'NOUN', 'SCONJ', 'PRON', 'VERB'])
+
+
+def random_docs(n=300, seed=5):
+    rng = random.Random(seed)
+    return [random_doc(VOCAB, rng, rng.randint(1, 8)) for _ in range(n)]
+
+
+DOCS = list(hand_built_docs()) + random_docs()
+
+
+def reference(doc):
+    return {feature: EXTRACTORS[feature](doc) for feature in FEATURES}
+
+
+def test_hand_built_docs_cover_every_structure():
+    found = {feature for doc in hand_built_docs() for feature, phrases in reference(doc).items() if phrases}
+    assert found == set(FEATURES)
+
+
+@pytest.mark.parametrize('features', [None, ['of', 'rc'], ['adj_nm', 'ml', 'comp']])
+def test_extract_all_and_match_store_give_the_count_phrases(features):
+    for doc in DOCS:
+        expected = {feature: phrases for feature, phrases in reference(doc).items()
+                    if features is None or feature in features}
+        assert extract_all(doc, features) == expected
+        store = MatchStore.from_doc(doc, features)
+        assert {feature: store.phrases(doc, feature) for feature in store.features} == expected
+        assert store.counts() == {feature: len(phrases) for feature, phrases in expected.items()}
+        assert MatchStore.from_bytes(store.to_bytes(), features).counts() == store.counts()
+
+
+@pytest.mark.parametrize('features', [None, ['of', 'rc'], ['adj', 'nm', 'poss', 'nonf', 'prep']])
+def test_counters_agree_with_count_functions(features):
+    rules = RuleSet.from_file(VOCAB)
+    for doc in DOCS:
+        expected = {feature: len(phrases) for feature, phrases in reference(doc).items()
+                    if features is None or feature in features}
+        assert count_all(doc, features) == expected
+        assert count_all_vectorized(doc, features) == expected
+        assert rules.count(doc, features) == expected
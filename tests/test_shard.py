@@ -0,0 +1,103 @@
+import csv
+import json
+import os
+import shutil
+
+import pytest
+
+from npca_engine import run_corpus, select_columns
+from npca_shard import build_manifest, load_manifest, merge_shards, save_manifest, shard_files, write_shard_meta
+
+COLUMNS = select_columns(['of', 'prep', 'rc'])
+
+
+def run_shards(nlp, corpus, tmp_path, n_shards=3, by='hash'):
+    manifest = build_manifest(corpus, COLUMNS, n_shards, by)
+    parts = []
+    for shard in range(n_shards):
+        part = str(tmp_path / f'part{shard}.csv')
+        run_corpus(corpus, part, manifest['columns'], nlp=nlp, file_list=shard_files(manifest, shard, corpus))
+        write_shard_meta(part, manifest, shard, 'stub')
+        parts.append(part)
+    return manifest, parts
+
+
+def read_rows(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        return list(csv.reader(file))
+
+
+@pytest.mark.parametrize('by', ['hash', 'size'])
+def test_merge_equals_single_run(nlp, corpus, tmp_path, by):
+    manifest, parts = run_shards(nlp, corpus, tmp_path, by=by)
+    merged = str(tmp_path / 'merged.csv')
+    assert merge_shards(manifest, parts, merged) == 8
+
+    single = str(tmp_path / 'single.csv')
+    run_corpus(corpus, single, COLUMNS, nlp=nlp)
+    header, *rows = read_rows(merged)
+    assert header == read_rows(single)[0]
+    assert [row[0] for row in rows] == [record['name'] for record in manifest['files']]
+    assert sorted(rows) == sorted(read_rows(single)[1:])
+
+
+def test_merge_quoted_file_names(nlp, corpus, tmp_path):
+    shutil.move(os.path.join(corpus, 'text00.txt'), os.path.join(corpus, 'a, "b".txt'))
+    manifest, parts = run_shards(nlp, corpus, tmp_path)
+    merged = str(tmp_path / 'merged.csv')
+    merge_shards(manifest, parts, merged)
+    assert 'a, "b".txt' in [row[0] for row in read_rows(merged)[1:]]
+
+
+def test_merge_refuses_duplicate_shard(nlp, corpus, tmp_path):
+    manifest, parts = run_shards(nlp, corpus, tmp_path)
+    with pytest.raises(ValueError, match='given twice'):
+        merge_shards(manifest, parts + parts[:1], str(tmp_path / 'merged.csv'))
+
+
+def test_merge_refuses_missing_shard(nlp, corpus, tmp_path):
+    manifest, parts = run_shards(nlp, corpus, tmp_path)
+    with pytest.raises(ValueError, match='Missing shards'):
+        merge_shards(manifest, parts[1:], str(tmp_path / 'merged.csv'))
+
+
+def test_merge_refuses_incomplete_part(nlp, corpus, tmp_path):
+    manifest, parts = run_shards(nlp, corpus, tmp_path)
+    part = next(part for part in parts if len(read_rows(part)) > 2)
+    with open(part, encoding='utf-8') as file:
+        lines = file.readlines()
+    with open(part, 'w', encoding='utf-8') as file:
+        file.writelines(lines[:-1])
+    with pytest.raises(ValueError, match='does not hold the files'):
+        merge_shards(manifest, parts, str(tmp_path / 'merged.csv'))
+
+
+def test_merge_refuses_duplicate_row(nlp, corpus, tmp_path):
+    manifest, parts = run_shards(nlp, corpus, tmp_path)
+    part = next(part for part in parts if len(read_rows(part)) > 1)
+    with open(part, encoding='utf-8') as file:
+        lines = file.readlines()
+    with open(part, 'a', encoding='utf-8') as file:
+        file.write(lines[1])
+    with pytest.raises(ValueError, match='more than one row'):
+        merge_shards(manifest, parts, str(tmp_path / 'merged.csv'))
+
+
+def test_merge_refuses_part_of_other_manifest(nlp, corpus, tmp_path):
+    manifest, parts = run_shards(nlp, corpus, tmp_path)
+    other = build_manifest(corpus, COLUMNS, 3, 'size')
+    write_shard_meta(parts[0], other, 0, 'stub')
+    with pytest.raises(ValueError, match='another manifest'):
+        merge_shards(manifest, parts, str(tmp_path / 'merged.csv'))
+
+
+def test_modified_manifest_is_refused(corpus, tmp_path):
+    path = str(tmp_path / 'manifest.json')
+    save_manifest(build_manifest(corpus, COLUMNS, 2), path)
+    assert load_manifest(path)['shards'] == 2
+    with open(path, encoding='utf-8') as file:
+        manifest = json.load(file)
+    manifest['files'][0]['shard'] = 1 - manifest['files'][0]['shard']
+    save_manifest(manifest, path)
+    with pytest.raises(ValueError, match='modified'):
+        load_manifest(path)